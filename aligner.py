@@ -0,0 +1,188 @@
+import re
+import numpy as np
+import envelope
+
+"""
+  Script-aware word timing for transcriber.py --script.
+  We already know what was said (the script f5-tts read), so instead of
+  open-vocabulary ASR the words are placed on the audio envelope: pauses
+  found with envelope.py are matched to word boundaries (preferring ones
+  after punctuation) by a monotonic DP that keeps the speaking rate steady, then
+  the words between two matched pauses share that stretch of speech in
+  proportion to their estimated syllables. Stretches whose speaking rate is
+  far off the file's average, or that run over a sentence end
+  without a pause, get low confidence, and transcriber.py re-runs
+  ASR on just those.
+"""
+
+WINDOW = 0.01          # seconds per envelope window
+PAUSE_THRESH = 0.05    # normalized RMS below this is silence
+MIN_PAUSE = 0.12       # shorter silences are stops/breaths inside words
+MIN_CONFIDENCE = 0.5   # chunks below this fall back to ASR
+RATE_SPREAD = 0.5      # relative speaking-rate noise of a one-syllable stretch
+BAND = 0.1             # pauses only match boundaries this close in share of the script
+MAX_SKIP = 8           # pauses a single chunk may swallow
+SENTENCE_BONUS = 4.0
+PUNCT_BONUS = {".": SENTENCE_BONUS, "!": SENTENCE_BONUS, "?": SENTENCE_BONUS, ",": 2.0, ";": 2.0, ":": 2.0}
+SKIP_COST = 8.0        # per second of pause left inside a chunk
+
+def script_words(text):
+    """Whitespace-separated words of a script, dropping tokens with nothing pronounceable."""
+    return [w for w in text.split() if re.search(r"\w", w)]
+
+def word_weight(word):
+    """Rough spoken length of a word: vowel groups (syllables), numbers read digit by digit."""
+    core = word.lower()
+    digits = len(re.findall(r"\d", core))
+    syllables = len(re.findall(r"[aeiouy]+", re.sub(r"\d", "", core)))
+    return 0.5 + max(syllables, 1 if not digits else 0) + 1.5 * digits
+
+def boundary_bonus(word):
+    """How likely a pause is right after this word."""
+    return PUNCT_BONUS.get(word.rstrip("\"')]")[-1:], 0.0)
+
+def find_pauses(wav_path, pause_thresh=PAUSE_THRESH, min_pause=MIN_PAUSE, window=WINDOW):
+    """
+    (speech_start, speech_end, gaps) in seconds, gaps being an (K, 2) array
+    of the silences of at least min_pause between first and last speech.
+    """
+    sr, data = envelope.load_mono(wav_path)
+    frame_size = max(int(window * sr), 1)
+    hop = frame_size / sr
+    pauses = envelope.pause_mask(envelope.windowed_rms(data, frame_size), pause_thresh)
+    voiced = np.flatnonzero(~pauses)
+    if len(voiced) == 0:
+        return 0.0, len(data) / sr, np.zeros((0, 2))
+    first, last = voiced[0], voiced[-1] + 1
+    inner = pauses[first:last]
+    edges = np.diff(np.concatenate(([0], inner.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    long_enough = (ends - starts) * hop >= min_pause
+    gaps = np.column_stack((first + starts[long_enough], first + ends[long_enough])) * hop
+    return first * hop, last * hop, gaps.reshape(-1, 2)
+
+def match_pauses(weights, bonuses, gap_times, gap_lens, speaking_total):
+    """
+    Monotonic assignment of pauses to word boundaries. Boundary b (1..N-1)
+    sits after word b-1, gap_times is the speaking time before each pause.
+    Each chunk between two assigned pauses costs how far its speaking rate is
+    from the file's (weighted by its length), minus the punctuation bonus of
+    its end, plus SKIP_COST for every pause left inside it.
+    Returns, per pause, its boundary or 0 if the pause stays inside a chunk.
+    """
+    n = len(weights)
+    k_count = len(gap_times)
+    result = np.zeros(k_count, dtype=np.int64)
+    if n < 2 or k_count == 0 or speaking_total <= 0:
+        return result
+    cum = np.concatenate(([0.0], np.cumsum(weights)))
+    rate = cum[-1] / speaking_total
+    bonus = np.concatenate(([0.0], bonuses[:n - 1], [0.0]))  # boundary b follows word b-1
+    skip = np.concatenate(([0.0], np.cumsum(SKIP_COST * np.asarray(gap_lens))))
+
+    # Virtual pauses at the start (boundary 0) and end (boundary n) of speech
+    times = np.concatenate(([0.0], gap_times, [speaking_total]))
+    inner = np.arange(1, n)
+    candidates = [np.array([0])]
+    for t in gap_times:
+        candidates.append(inner[np.abs(cum[1:n] / cum[-1] - t / speaking_total) <= BAND])
+    candidates.append(np.array([n]))
+
+    costs = [np.zeros(1)]
+    back = [None]
+    for k in range(1, k_count + 2):
+        b = candidates[k]
+        best = np.full(len(b), np.inf)
+        from_k = np.zeros(len(b), dtype=np.int64)
+        from_i = np.zeros(len(b), dtype=np.int64)
+        for prev in range(max(0, k - MAX_SKIP - 1), k):
+            b_prev = candidates[prev]
+            if len(b) == 0 or len(b_prev) == 0:
+                continue
+            chunk_weight = cum[b][None, :] - cum[b_prev][:, None]
+            seconds = times[k] - times[prev]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                deviation = np.log(chunk_weight / (seconds * rate))
+                total = (costs[prev][:, None] + deviation ** 2 * chunk_weight / RATE_SPREAD ** 2
+                         + (skip[k - 1] - skip[prev]))
+            total[~(chunk_weight > 0)] = np.inf
+            i = np.argmin(total, axis=0)
+            value = total[i, np.arange(len(b))] - bonus[b]
+            better = value < best
+            best[better] = value[better]
+            from_k[better] = prev
+            from_i[better] = i[better]
+        costs.append(best)
+        back.append((from_k, from_i))
+
+    if not np.isfinite(costs[-1][0]):
+        return result
+    k, i = k_count + 1, 0
+    while k > 0:
+        from_k, from_i = back[k]
+        k, i = int(from_k[i]), int(from_i[i])
+        if k > 0:
+            result[k - 1] = candidates[k][i]
+    return result
+
+def spread_words(weights, t0, t1, inner_gaps):
+    """Start/end times of words sharing [t0, t1] by weight, skipping the silences in inner_gaps."""
+    # Piecewise map from speaking time to clock time around the inner silences
+    clock = [t0]
+    speaking = [0.0]
+    for g0, g1 in inner_gaps:
+        speaking.append(speaking[-1] + (g0 - clock[-1]))
+        clock.append(g0)
+        speaking.append(speaking[-1])
+        clock.append(g1)
+    speaking.append(speaking[-1] + (t1 - clock[-1]))
+    clock.append(t1)
+    edges = np.concatenate(([0.0], np.cumsum(weights))) / np.sum(weights) * speaking[-1]
+    times = np.interp(edges, speaking, clock)
+    return times[:-1], times[1:]
+
+def align_script(wav_path, script_text):
+    """
+    Word timings for script_text on wav_path.
+    Returns (words, chunks): words as (start, end, text) in script order, and
+    chunks as (first_word, end_word, start, end, confidence).
+    """
+    words = script_words(script_text)
+    if not words:
+        return [], []
+    speech_start, speech_end, gaps = find_pauses(wav_path)
+    weights = np.array([word_weight(w) for w in words])
+    bonuses = np.array([boundary_bonus(w) for w in words])
+
+    # Pause position as a share of the speaking time before it
+    gap_lens = gaps[:, 1] - gaps[:, 0]
+    speaking_total = (speech_end - speech_start) - gap_lens.sum()
+    speaking_before = gaps[:, 0] - speech_start - np.concatenate(([0.0], np.cumsum(gap_lens)[:-1]))
+    assigned = match_pauses(weights, bonuses, speaking_before, gap_lens, speaking_total)
+
+    # Chunks run between matched pauses, unmatched pauses stay inside them
+    bounds = [(0, speech_start)]
+    for k in np.flatnonzero(assigned):
+        bounds.append((int(assigned[k]), gaps[k, 0], gaps[k, 1]))
+    bounds.append((len(words), speech_end))
+    rate = weights.sum() / speaking_total if speaking_total > 0 else 0.0
+
+    timed = []
+    chunks = []
+    for prev, cur in zip(bounds[:-1], bounds[1:]):
+        w0, t0 = prev[0], prev[-1]
+        w1, t1 = cur[0], cur[1]
+        inner = [g for g in gaps if t0 < g[0] and g[1] < t1]
+        speaking = (t1 - t0) - sum(g1 - g0 for g0, g1 in inner)
+        chunk_weights = weights[w0:w1]
+        if speaking > 0 and rate > 0:
+            confidence = float(np.exp(-abs(np.log((chunk_weights.sum() / speaking) / rate))))
+        else:
+            confidence = 0.0
+        # TTS pauses at every sentence end, one without a pause means the words drifted
+        confidence *= 0.5 ** int(np.sum(bonuses[w0:w1 - 1] >= SENTENCE_BONUS))
+        starts, ends = spread_words(chunk_weights, t0, t1, inner)
+        timed.extend(zip(starts.tolist(), ends.tolist(), words[w0:w1]))
+        chunks.append((w0, w1, t0, t1, confidence))
+    return timed, chunks
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+"""
+  Content-addressed store of rendered/downloaded visuals shared by every
+  video, so the same equation or historical figure is fetched once instead
+  of once per output folder (which flow.ps1 may delete).
+  Files live at <root>/<key[:2]>/<key><ext>, keyed by a hash of (type,
+  normalized details, renderer version), with a SQLite index holding the
+  metadata and last use for LRU eviction past max_bytes.
+"""
+
+STORE_PATH = os.environ.get("ASSET_STORE_PATH", "./cache/assets")
+STORE_MAX_BYTES = int(os.environ.get("ASSET_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Bump a type's version when its renderer's output changes, old entries then miss
+RENDERER_VERSIONS = {
+    "image": 1,
+    "equation": 1,
+    "diagram": 2,  # 2: rasterized at overlay size
+    "text": 2,  # 2: stroked outline
+}
+
+def normalize_details(kind, details):
+    """Details that produce the same visual map to the same text."""
+    details = re.sub(r"\s+", " ", str(details)).strip()
+    if kind == "image":
+        details = details.lower()  # image search is case-insensitive
+    return details
+
+def store_key(kind, details, version=None):
+    if version is None:
+        version = RENDERER_VERSIONS.get(kind, 1)
+    raw = f"{kind}\0{version}\0{normalize_details(kind, details)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def link_or_copy(src, dst):
+    """Hard link src at dst (cheap, survives eviction from the store), copy if linking fails."""
+    out_dir = os.path.dirname(dst)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+    return dst
+
+class AssetStore:
+    def __init__(self, root=STORE_PATH, max_bytes=STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # SQLite's locking (plus the busy timeout) keeps the index consistent
+        # between processes; files are only ever published with os.replace
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS assets ("
+            " key TEXT PRIMARY KEY, type TEXT, details TEXT, version INTEGER,"
+            " path TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self._db.commit()
+
+    def get(self, kind, details):
+        """Path of the stored visual, or None."""
+        key = store_key(kind, details)
+        with self._lock:
+            row = self._db.execute("SELECT path FROM assets WHERE key = ?", (key,)).fetchone()
+            path = os.path.join(self.root, row[0]) if row else None
+            if path is not None and not os.path.isfile(path):
+                # Removed behind our back, forget it
+                self._db.execute("DELETE FROM assets WHERE key = ?", (key,))
+                self._db.commit()
+                path = None
+            if path is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE assets SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return path
+
+    def put(self, kind, details, src_path):
+        """Copy a finished visual into the store. Returns its stored path."""
+        key = store_key(kind, details)
+        rel_path = os.path.join(key[:2], key + os.path.splitext(src_path)[1].lower())
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, normalize_details(kind, details), RENDERER_VERSIONS.get(kind, 1),
+                 rel_path, os.path.getsize(path), now, now),
+            )
+            self._evict(keep=key)
+            self._db.commit()
+        return path
+
+    def _evict(self, keep=None):
+        """Delete least recently used files until the store fits in max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM assets").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, rel_path, size in self._db.execute("SELECT key, path, size FROM assets ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.root, rel_path))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM assets WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM assets").fetchone()
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries, "bytes": total}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """The process-wide AssetStore, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssetStore()
+        return _store
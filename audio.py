@@ -1,68 +1,191 @@
-import sys
 import os
+import glob
+import time
+import argparse
+import functools
+import concurrent.futures
 import numpy as np
-import noisereduce as nr
+from scipy.signal import fftconvolve, stft, istft
 from pedalboard import Pedalboard, Gain, NoiseGate, Compressor, LowShelfFilter
 from pedalboard.io import AudioFile
+from render_pool import default_workers, process_workers
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python audio.py <input_wav_path>")
-        sys.exit(1)
+"""
+  Cleans up TTS output: stationary noise reduction, then gate, compressor,
+  low shelf and gain, written next to the input as <name>_cleaned.wav.
+    python audio.py in.wav                       one file
+    python audio.py voices/*.wav out/a.wav ...   many files (paths or globs) over a process pool
+  The file is streamed through in BLOCK_SIZE blocks, so memory stays the
+  same however long it is. The noise reduction is noisereduce's stationary
+  spectral gate (nr.reduce_noise(stationary=True), run per channel) done on
+  all channels of a block at once: it works in blocks of that size too,
+  padded with PADDING samples of context on each side and with each
+  channel's noise profile taken from the first block, so the output matches
+  it within tolerance (test_audio.py checks how close). The Pedalboard
+  keeps its state between blocks and is reset between files.
+"""
 
-    input_path = sys.argv[1]
-    if not os.path.isfile(input_path):
-        print(f"File not found: {input_path}")
-        sys.exit(1)
+BLOCK_SIZE = 600000  # samples, noisereduce's chunk_size
+PADDING = 30000  # samples of context on each side of a block, noisereduce's padding
+PROP_DECREASE = 0.75
+N_FFT = 1024
+HOP_LENGTH = N_FFT // 4
+N_STD_THRESH = 1.5  # noise threshold, in standard deviations above the noise's mean dB
+FREQ_MASK_SMOOTH_HZ = 500
+TIME_MASK_SMOOTH_MS = 50
 
-    # Load audio file
-    with AudioFile(input_path, 'r') as f:
-        audio = f.read(f.frames)
-        samplerate = f.samplerate
-        num_channels = f.num_channels
-    print(f"Loaded audio: shape={audio.shape}, dtype={audio.dtype}, samplerate={samplerate}, channels={num_channels}")
-
-    # Noise reduction
-    if num_channels > 1:
-        reduced_noise = np.zeros_like(audio)
-        for ch in range(num_channels):
-            reduced_noise[:, ch] = nr.reduce_noise(
-                y=audio[:, ch], sr=samplerate, stationary=True, prop_decrease=0.75
-            )
-    else:
-        reduced_noise = nr.reduce_noise(
-            y=audio, sr=samplerate, stationary=True, prop_decrease=0.75
-        )
-        # Ensure shape is (frames, 1) for mono
-        reduced_noise = reduced_noise.reshape(-1, 1)
-    print(f"After noise reduction: shape={reduced_noise.shape}, dtype={reduced_noise.dtype}")
-
-    # Enhancing through pedalboard
-    board = Pedalboard([
+@functools.lru_cache(maxsize=None)
+def get_board():
+    """The effect chain, built once per process. Reset it before each file."""
+    return Pedalboard([
         NoiseGate(threshold_db=-30, ratio=1.5, release_ms=250),
         Compressor(threshold_db=-16, ratio=4),
         LowShelfFilter(cutoff_frequency_hz=400, gain_db=10, q=1),
         Gain(gain_db=2)
     ])
-    effected = board(reduced_noise, samplerate)
-    print(f"After pedalboard: shape={effected.shape}, dtype={effected.dtype}")
 
-    # Prepare output path
+def cleaned_path(input_path):
     base, ext = os.path.splitext(input_path)
-    output_path = f"{base}_cleaned.wav"
+    return f"{base}_cleaned.wav"
+
+def is_up_to_date(input_path, output_path):
+    """True if output_path exists and is newer than input_path."""
+    return os.path.isfile(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+def read_padded(f, start, end):
+    """Samples start..end of an open AudioFile as (channels, frames) float64, zeros outside the file."""
+    block = np.zeros((f.num_channels, end - start))
+    first, last = max(start, 0), min(end, f.frames)
+    if last > first:
+        f.seek(first)
+        block[:, first - start:last - start] = f.read(last - first)
+    return block
+
+def amp_to_db(x, top_db=80.0):
+    x_db = 20 * np.log10(np.abs(x) + np.finfo(np.float64).eps)
+    return np.maximum(x_db, np.max(x_db, axis=-1, keepdims=True) - top_db)
+
+def spectrogram(samples):
+    _, _, spec = stft(samples, nfft=N_FFT, noverlap=N_FFT - HOP_LENGTH, nperseg=N_FFT, padded=False)
+    return spec
+
+def smoothing_filter(samplerate):
+    """Triangular kernel the gate mask is smoothed with, over FREQ_MASK_SMOOTH_HZ and TIME_MASK_SMOOTH_MS."""
+    n_freq = int(FREQ_MASK_SMOOTH_HZ / (samplerate / (N_FFT / 2)))
+    n_time = int(TIME_MASK_SMOOTH_MS / ((HOP_LENGTH / samplerate) * 1000))
+    def ramp(n):
+        return np.concatenate([np.linspace(0, 1, n + 1, endpoint=False), np.linspace(1, 0, n + 2)])[1:-1]
+    kernel = np.outer(ramp(max(n_freq, 1)), ramp(max(n_time, 1)))
+    return kernel / np.sum(kernel)
 
-    # Ensure output is float32 and in range [-1, 1]
-    effected = np.clip(effected, -1.0, 1.0).astype(np.float32)
-    # If mono, ensure shape is (frames, 1)
-    if effected.ndim == 1:
-        effected = effected.reshape(-1, 1)
+def noise_threshold(noise_clip):
+    """(channels, freqs) dB threshold from a (channels, frames) noise clip, each channel its own profile."""
+    noise_db = amp_to_db(spectrogram(noise_clip))  # (channels, freqs, times)
+    return np.mean(noise_db, axis=-1) + np.std(noise_db, axis=-1) * N_STD_THRESH
 
-    # Save cleaned audio
-    with AudioFile(output_path, 'w', samplerate, effected.shape[1]) as f:
-        f.write(effected)
-    print(f"Saved audio: shape={effected.shape}, dtype={effected.dtype}")
+def spectral_gate(block, threshold, kernel):
+    """Stationary spectral gating of every channel of a (channels, frames) block in one pass."""
+    spec = spectrogram(block)  # (channels, freqs, times)
+    mask = (amp_to_db(spec) > threshold[..., None]) * PROP_DECREASE + (1.0 - PROP_DECREASE)
+    mask = fftconvolve(mask, kernel[None], mode="same", axes=(1, 2))
+    _, denoised = istft(spec * mask, nfft=N_FFT, noverlap=N_FFT - HOP_LENGTH, nperseg=N_FFT)
+    out = np.zeros(block.shape, block.dtype)
+    out[:, :denoised.shape[1]] = denoised[:, :block.shape[1]]
+    return out
 
-    print(f"Cleaned audio saved to: {output_path}")
+def clean_audio(input_path, output_path=None, block_size=BLOCK_SIZE, padding=PADDING):
+    """Stream input_path through noise reduction and the board into output_path. Returns output_path."""
+    output_path = output_path or cleaned_path(input_path)
+    board = get_board()
+    board.reset()  # no tail of the previous file
+    with AudioFile(input_path, 'r') as f:
+        samplerate = f.samplerate
+        num_channels = f.num_channels
+        print(f"Loading audio: {input_path}, frames={f.frames}, samplerate={samplerate}, channels={num_channels}")
+        # Noise profile estimated once, from the start of the file like reduce_noise does
+        threshold = noise_threshold(f.read(min(block_size, f.frames)))
+        kernel = smoothing_filter(samplerate)
+
+        with AudioFile(output_path, 'w', samplerate, num_channels) as out:
+            for start in range(0, f.frames, block_size):
+                end = min(start + block_size, f.frames)
+                block = read_padded(f, start - padding, start + block_size + padding)
+                reduced = spectral_gate(block, threshold, kernel)[:, padding:padding + end - start]
+                effected = board(reduced.astype(np.float32), samplerate, reset=False)
+                # Ensure output is float32 and in range [-1, 1]
+                out.write(np.clip(effected, -1.0, 1.0).astype(np.float32))
+    return output_path
+
+def _clean_job(input_path, block_size):
+    start = time.perf_counter()
+    output_path = clean_audio(input_path, block_size=block_size)
+    return output_path, time.perf_counter() - start
+
+def clean_many(inputs, workers=None, block_size=BLOCK_SIZE, force=False):
+    """
+    Clean many files (paths or globs) over a process pool, skipping any whose
+    _cleaned.wav is newer unless force. Returns (cleaned paths, failed inputs).
+    """
+    paths = []
+    for pattern in inputs:
+        if not glob.has_magic(pattern):
+            paths.append(pattern)  # a plain path is cleaned whatever its name
+            continue
+        matches = sorted(glob.glob(pattern))
+        # A glob like *.wav also matches earlier outputs, those aren't inputs
+        paths.extend([p for p in matches if not p.endswith("_cleaned.wav")] if matches else [pattern])
+    todo = []
+    failed = []
+    skipped = 0
+    for path in paths:
+        if not os.path.isfile(path):
+            print(f"File not found: {path}")
+            failed.append(path)
+        elif not force and is_up_to_date(path, cleaned_path(path)):
+            print(f"Up to date: {cleaned_path(path)}")
+            skipped += 1
+        else:
+            todo.append(path)
+    if not todo:
+        return [], failed
+
+    start = time.perf_counter()
+    cleaned = []
+    workers = min(process_workers(workers or default_workers()), len(todo))
+    # One file needs no pool, and the pool's workers each keep their board
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor:
+            futures = {executor.submit(_clean_job, path, block_size): path for path in todo}
+            done = ((futures[f], f.result) for f in concurrent.futures.as_completed(futures))
+        else:
+            done = ((path, functools.partial(_clean_job, path, block_size)) for path in todo)
+        for path, result in done:
+            try:
+                output_path, seconds = result()
+            except Exception as e:
+                print(f"Failed to clean {path}: {e}")
+                failed.append(path)
+                continue
+            print(f"Cleaned audio saved to: {output_path} ({seconds:.1f}s)")
+            cleaned.append(output_path)
+    finally:
+        if executor:
+            executor.shutdown()
+    print(f"Cleaned {len(cleaned)}/{len(todo)} files in {time.perf_counter() - start:.1f}s "
+          f"({skipped} up to date)")
+    return cleaned, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Noise reduce and enhance TTS wavs into <name>_cleaned.wav.")
+    parser.add_argument("inputs", nargs="+", metavar="input_wav_path", help="Wav paths or globs.")
+    parser.add_argument("--workers", type=int, default=None, help="Files cleaned side by side (default: one per core).")
+    parser.add_argument("--block_size", type=int, default=BLOCK_SIZE, help="Samples per streamed block (default: %(default)s).")
+    parser.add_argument("--force", action="store_true", help="Clean files even if their _cleaned.wav is newer.")
+    args = parser.parse_args()
+    cleaned, failed = clean_many(args.inputs, args.workers, args.block_size, args.force)
+    if failed:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,94 @@
+import re
+import time
+import argparse
+import difflib
+import numpy as np
+from subtitle import parse_srt
+from transcriber import MODEL_SIZE, COMPUTE_TYPE, load_model, transcribe_words, transcribe_chunked, align_words
+
+"""
+  Speed and timestamp accuracy of transcriber.py --script (aligner.py) and
+  --chunks against plain Whisper decoding on the same wav.
+    python benchmark_align.py output/x/infer_cli_basic_cleaned.wav scripts/x.txt
+    python benchmark_align.py output/x/infer_cli_basic_cleaned.wav --chunks 4
+  Timestamps are compared word by word against a reference: a hand-checked
+  word SRT if --reference is given, otherwise the Whisper words themselves.
+  --chunks also runs the chunked transcription twice to check it is
+  deterministic.
+"""
+
+def normalize(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+def timing_errors(words, reference):
+    """Start/end errors in seconds over the words that match the reference text in order."""
+    matcher = difflib.SequenceMatcher(None, [normalize(w[2]) for w in words],
+                                      [normalize(w[2]) for w in reference], autojunk=False)
+    starts, ends = [], []
+    for block in matcher.get_matching_blocks():
+        for i in range(block.size):
+            a, b = words[block.a + i], reference[block.b + i]
+            starts.append(abs(a[0] - b[0]))
+            ends.append(abs(a[1] - b[1]))
+    return np.array(starts), np.array(ends)
+
+def summarize(name, words, reference):
+    starts, ends = timing_errors(words, reference)
+    print(f"{name}: {len(starts)}/{len(reference)} reference words matched, {len(words)} words")
+    if not len(starts):
+        return
+    for label, errors in (("start", starts), ("end", ends)):
+        print(f"  {label} error: mean {errors.mean() * 1000:.0f}ms, median {np.median(errors) * 1000:.0f}ms, "
+              f"p90 {np.percentile(errors, 90) * 1000:.0f}ms, within 100ms {np.mean(errors <= 0.1):.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark script alignment against Whisper transcription.")
+    parser.add_argument("wav", help="Narration wav.")
+    parser.add_argument("script", nargs="?", help="Text the narration was generated from.")
+    parser.add_argument("--reference", help="Word-per-entry SRT with trusted timestamps.")
+    parser.add_argument("--chunks", type=int, default=0, metavar="N", help="Also time --chunks N transcription.")
+    parser.add_argument("--model", default=MODEL_SIZE)
+    parser.add_argument("--compute_type", default=COMPUTE_TYPE)
+    args = parser.parse_args()
+    if not (args.script or args.chunks):
+        parser.error("give a script, --chunks or both")
+
+    # Loaded up front so no timing includes it
+    model = load_model(args.model, args.compute_type, num_workers=max(args.chunks, 1))
+
+    start = time.perf_counter()
+    asr_words, duration = transcribe_words(model, args.wav)
+    asr_seconds = time.perf_counter() - start
+    print(f"{duration:.1f}s of audio")
+    print(f"Whisper:  {asr_seconds:.2f}s (RTF {asr_seconds / duration:.3f}), {len(asr_words)} words")
+    results = {"Whisper": asr_words}
+
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script_text = f.read()
+        start = time.perf_counter()
+        aligned_words, _, redone = align_words(lambda: model, args.wav, script_text)
+        align_seconds = time.perf_counter() - start
+        print(f"Aligned:  {align_seconds:.2f}s (RTF {align_seconds / duration:.3f}), {len(aligned_words)} words, "
+              f"{redone:.1f}s re-transcribed, {asr_seconds / align_seconds:.1f}x faster")
+        results["Aligned"] = aligned_words
+
+    if args.chunks:
+        start = time.perf_counter()
+        chunked_words, _ = transcribe_chunked(model, args.wav, args.chunks)
+        chunked_seconds = time.perf_counter() - start
+        print(f"Chunked:  {chunked_seconds:.2f}s (RTF {chunked_seconds / duration:.3f}), {len(chunked_words)} words, "
+              f"{asr_seconds / chunked_seconds:.1f}x faster")
+        repeat_words, _ = transcribe_chunked(model, args.wav, args.chunks)
+        print(f"Chunked output {'identical' if repeat_words == chunked_words else 'DIFFERS'} on a second run")
+        results["Chunked"] = chunked_words
+
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = [(s.total_seconds(), e.total_seconds(), text) for s, e, text in parse_srt(f.read())]
+        for name, words in results.items():
+            summarize(f"{name} vs reference", words, reference)
+    else:
+        for name, words in results.items():
+            if name != "Whisper":
+                summarize(f"{name} vs Whisper", words, asr_words)
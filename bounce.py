@@ -1,150 +1,164 @@
 import os
 import sys
-import math
+import argparse
 import numpy as np
-try:
-    import cupy as cp
-    CUPY_AVAILABLE = True
-except ImportError:
-    cp = np
-    CUPY_AVAILABLE = False
 from PIL import Image
 from scipy.io import wavfile
-import concurrent.futures
+import envelope
+import motion
+import render_pool
+from sprite_cache import SpriteCache
+from frame_pipe import FrameWriter, is_video_path, map_ordered
 
 def get_pause_segments(wav_path, pause_thresh=0.05, min_pause_len=0.2):
-    sr, data = wavfile.read(wav_path)
-    if data.ndim > 1:
-        data = data.mean(axis=1)  # mono
-    # Move data to GPU if possible
-    data_cp = cp.asarray(data)
-    data_cp = data_cp / cp.max(cp.abs(data_cp))
+    # Windowed RMS + pause mask in one vectorized pass, see envelope.py
+    sr, data = envelope.load_mono(wav_path)
     frame_size = int(0.02 * sr)
-    hop = frame_size
-    energies = cp.array([
-        cp.sqrt(cp.mean(data_cp[i:i+frame_size]**2))
-        for i in range(0, len(data)-frame_size, hop)
-    ])
-    pauses = energies < pause_thresh
-    pauses = cp.asnumpy(pauses)  # back to numpy for Python logic
-    pause_segments = []
-    start = 0
-    in_pause = False
-    for i, p in enumerate(pauses):
-        t = i * hop / sr
-        if p and not in_pause:
-            in_pause = True
-            pause_start = t
-            if pause_start > start:
-                pause_segments.append((start, pause_start))
-        elif not p and in_pause:
-            in_pause = False
-            start = t
-    if start < len(data)/sr:
-        pause_segments.append((start, len(data)/sr))
-    return pause_segments
+    energies = envelope.windowed_rms(data, frame_size)
+    pauses = envelope.pause_mask(energies, pause_thresh)
+    segments = envelope.segments_from_mask(pauses, frame_size, sr, len(data))
+    return [(float(s), float(e)) for s, e in segments]
 
 def get_avg_volumes(wav_path, segments):
-    sr, data = wavfile.read(wav_path)
-    if data.ndim > 1:
-        data = data.mean(axis=1)
-    data_cp = cp.asarray(data)
-    data_cp = data_cp / cp.max(cp.abs(data_cp))
-    volumes = []
-    for start, end in segments:
-        s = int(start * sr)
-        e = int(end * sr)
-        if e > s:
-            vol = cp.sqrt(cp.mean(data_cp[s:e]**2))
-            vol = float(vol.get()) if CUPY_AVAILABLE else float(vol)
-        else:
-            vol = 0
-        volumes.append(vol)
-    return volumes
-
-def generate_frame(args):
-    i, t, segment_idx, volumes, max_vol, img, W, H, scale_coeff, segments, frame_times, output_dir, scale_base = args
-    # Find which segment this frame is in
-    while segment_idx < len(segments) and t > segments[segment_idx][1]:
-        segment_idx += 1
-    # Always assign vol based on the current segment
-    if segment_idx < len(volumes):
-        vol = volumes[segment_idx]
-    else:
-        vol = volumes[-1]
-    norm_vol = vol / max_vol
-
-    # Bounce only when normalized volume is above threshold
-    bounce_amplitude = 25
-    bounce_freq = 5
-    bounce_threshold = 0.1
-    if vol > bounce_threshold:
-        bounce = -abs(vol) * bounce_amplitude * abs(math.sin(t * bounce_freq))
-    else:
-        bounce = 0
-
-    scale = scale_base + scale_coeff * norm_vol
-    """
-      The image is 500 pixels tall, 
-      The volume rnages usually from 0 to 0.25, 
-      and the subtitles are at around y=600, 
-      so we need to keep the image under that
-    """
-
-    x = int(W/2 - (img.width * scale) / 2+math.sin(t) * 10)
-    y = int(H - (img.height * scale) + bounce+math.cos(t)+20)+50
+    # Reuses the normalized samples cached by get_pause_segments
+    sr, data = envelope.load_mono(wav_path)
+    return envelope.segment_volumes(data, sr, segments).tolist()
+
+def render_frame(i, track, sprites):
+    # Everything about this frame was precomputed in the motion track
+    W, H = track["W"], track["H"]
+    scale = track["scale"][i]
+    x = int(track["x"][i])
+    y = int(track["y"][i])
 
     frame = Image.new("RGBA", (W, H), (0, 0, 0, 0))
-    img_resized = img.resize((int(img.width * scale), int(img.height * scale)), resample=Image.BICUBIC)
+    img_resized = sprites.get(scale)
     frame.paste(img_resized, (x, y), img_resized)
-
-
-    frame.save(os.path.join(output_dir, f"frame_{i:04d}.png"))
-
-image_path = sys.argv[1]  # ./assets/character/image.png
-output_dir = sys.argv[2]  # ./output/some_script/frames
-wav_path = sys.argv[3]    # ./output/some_script/audio.wav
-
-# Get duration from wav file
-sr, data = wavfile.read(wav_path)
-duration = len(data) / sr
-
-fps = 30
-scale_base = 0.75 
- # Base scale of the image
-scale_coeff = 0.25 # How much the image scales with volume
-
-os.makedirs(output_dir, exist_ok=True)
-
-# Load original image
-img = Image.open(image_path).convert("RGBA")
-# Scale image to 500 pixels tall
-target_height = 500
-aspect_ratio = img.width / img.height
-target_width = int(target_height * aspect_ratio)
-img = img.resize((target_width, target_height), resample=Image.BICUBIC)
-
-W, H = 640, 1080  # match video size
-
-num_frames = int(duration * fps)
-
-# Get pause segments and average volumes
-segments = get_pause_segments(wav_path)
-volumes = get_avg_volumes(wav_path, segments)
-if not volumes:
-    volumes = [1.0]
-max_vol = max(volumes) if max(volumes) > 0 else 1.0
-
-# Map each frame to a segment
-frame_times = np.linspace(0, duration, num_frames)
-segment_idx = 0
-
-# Prepare arguments for each frame
-args_list = []
-segment_idx = 0
-for i, t in enumerate(frame_times):
-    args_list.append((i, t, segment_idx, volumes, max_vol, img, W, H, scale_coeff, segments, frame_times, output_dir,scale_base))
-
-# Use ThreadPoolExecutor for multithreading (limit to 5 workers)
-with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-    list(executor.map(generate_frame, args_list))
\ No newline at end of file
+    return frame
+
+def worker_inputs():
+    # Track and sprite cache for this worker, rebuilt once from the shared inputs
+    state = render_pool.state
+    if "sprites" not in state:
+        state.setdefault("frame_track", dict(state["track"], W=state["frame_size"][0], H=state["frame_size"][1]))
+        state.setdefault("sprites", SpriteCache(state["sprite"], step=state["scale_step"]))
+    return state["frame_track"], state["sprites"]
+
+def cache_report(sprites):
+    # This worker's running sprite cache counters, returned with every frame
+    return os.getpid(), sprites.stats()
+
+def total_cache_stats(reports):
+    """Sum the last (pid, stats) cache_report of every worker."""
+    latest = {}
+    for pid, stats in reports:
+        # Counters only grow, the biggest report is the worker's latest (threads share one cache)
+        if pid not in latest or stats["hits"] + stats["misses"] > latest[pid]["hits"] + latest[pid]["misses"]:
+            latest[pid] = stats
+    hits = sum(stats["hits"] for stats in latest.values())
+    misses = sum(stats["misses"] for stats in latest.values())
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "entries": sum(stats["entries"] for stats in latest.values()),
+        "workers": len(latest),
+    }
+
+def generate_frame(i):
+    track, sprites = worker_inputs()
+    frame = render_frame(i, track, sprites)
+    frame.save(os.path.join(render_pool.state["output_dir"], f"frame_{i:04d}.png"))
+    return cache_report(sprites)
+
+def generate_frame_to_slot(i):
+    # Render into this frame's slot of the shared frame ring, the parent pipes it to ffmpeg
+    track, sprites = worker_inputs()
+    render_pool.slot("frames", i)[:] = render_frame(i, track, sprites).tobytes()
+    return i, cache_report(sprites)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the bouncing character frames for a wav.")
+    parser.add_argument("image_path", help="Character image, e.g. ./assets/character/image.png")
+    parser.add_argument("output_dir", help="Frames dir (./output/some_script/frames), or a .mov/.mkv/.webm to stream frames into ffmpeg")
+    parser.add_argument("wav_path", help="Audio to bounce to, e.g. ./output/some_script/audio.wav")
+    parser.add_argument("track_path", nargs="?", default=None, help="Where to save the motion track (.npz/.json), defaults to next to the frames dir")
+    parser.add_argument("--sprite_track", action="store_true",
+                        help="Don't render frames, write the sprite and its per-frame motion track to output_dir for images.py to place")
+    parser.add_argument("--executor", choices=("process", "thread"), default="process",
+                        help="Render frames in worker processes (shared memory) or threads")
+    parser.add_argument("--workers", type=int, default=None, help="Worker count, defaults to the number of available cores")
+    args = parser.parse_args()
+
+    image_path = args.image_path
+    output_dir = args.output_dir
+    wav_path = args.wav_path
+    track_path = args.track_path or os.path.join(os.path.dirname(os.path.normpath(output_dir)), "motion.npz")
+
+    # Get duration from wav file
+    sr, data = wavfile.read(wav_path)
+    duration = len(data) / sr
+
+    fps = 30
+    scale_base = 0.75
+     # Base scale of the image
+    scale_coeff = 0.25 # How much the image scales with volume
+    scale_step = 1/256 # Scale quantization for the sprite cache, 0 to resize every frame exactly
+
+    stream_output = is_video_path(output_dir)
+    if not stream_output and not args.sprite_track:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Load original image
+    img = Image.open(image_path).convert("RGBA")
+    # Scale image to 500 pixels tall
+    target_height = 500
+    aspect_ratio = img.width / img.height
+    target_width = int(target_height * aspect_ratio)
+    img = img.resize((target_width, target_height), resample=Image.BICUBIC)
+
+    W, H = 640, 1080  # match video size
+
+    num_frames = int(duration * fps)
+
+    # Get pause segments and average volumes
+    segments = get_pause_segments(wav_path)
+    volumes = get_avg_volumes(wav_path, segments)
+
+    # Map each frame to a segment and precompute x, y, scale and bounce
+    frame_times = np.linspace(0, duration, num_frames)
+    track = motion.build_motion_track(frame_times, segments, volumes, img.size, W, H, scale_base, scale_coeff, fps)
+    if args.sprite_track:
+        # Sparse output: kilobytes of transforms instead of a frame per 1/30 s
+        motion.save_sprite_track(track, img, output_dir)
+        if args.track_path:
+            motion.save_motion_track(track, track_path)
+        print(f"Sprite track with {num_frames} frames saved to {output_dir}")
+        sys.exit(0)
+    motion.save_motion_track(track, track_path)
+
+    # Sprite, track and frame buffers go into shared memory for process workers
+    with render_pool.SharedStore(use_shm=args.executor == "process") as store:
+        store.add_image("sprite", img)
+        store.add_arrays("track", {key: track[key] for key in ("scale", "x", "y")})
+        store.add_value("frame_size", (W, H))
+        store.add_value("scale_step", scale_step)
+        store.add_value("output_dir", output_dir)
+        window = 2 * (args.workers or render_pool.default_workers())
+        if stream_output:
+            store.add_ring("frames", window, W * H * 4)
+
+        with render_pool.make_executor(args.executor, store.spec(), args.workers) as executor:
+            if stream_output:
+                # Raw RGBA frames in order into ffmpeg, no PNGs on disk
+                reports = []
+                with FrameWriter(output_dir, W, H, fps) as writer:
+                    for i, report in map_ordered(executor, generate_frame_to_slot, range(num_frames), window):
+                        writer.write(store.slot("frames", i))
+                        reports.append(report)
+            else:
+                reports = list(executor.map(generate_frame, range(num_frames), chunksize=max(num_frames // (window * 4), 1)))
+
+    stats = total_cache_stats(reports)
+    print(f"Sprite cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%}), "
+          f"{stats['entries']} sizes cached over {stats['workers']} workers")
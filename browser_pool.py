@@ -0,0 +1,148 @@
+import atexit
+import threading
+from contextlib import contextmanager
+
+"""
+  Pool of warm headless browser sessions for the image search in images.py.
+  Starting Chrome takes seconds, so sessions are kept open across prompts and
+  handed out one caller at a time. A session is replaced after max_uses
+  pages, or straight away if a page load raises (it may have crashed).
+  Sessions live as long as the process that made them. single.ps1 keeps one
+  make_visuals.py --serve running for its batch, so videos after the first
+  find warm sessions; a lone flow.ps1 run starts its own.
+
+  The factory is injectable: anything with get(url), page_source and quit()
+  works, e.g. a stand-in that serves local static HTML.
+"""
+
+POOL_SIZE = 4
+MAX_USES = 50
+
+def chrome_driver():
+    """Headless Chrome with the options images.py has always used."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    options = Options()
+    options.add_argument("--headless=new")  # Use newer headless mode
+    options.add_argument("--no-sandbox")  # Improve compatibility in some environments
+    options.add_argument("--disable-dev-shm-usage")  # Avoid shared memory issues
+    options.add_argument("--disable-gpu")  # Disable GPU for headless stability
+    options.add_argument("--window-size=1920,1080")  # Set a window size for rendering
+    return webdriver.Chrome(options=options)
+
+class _Session:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+class BrowserPool:
+    def __init__(self, factory=chrome_driver, size=POOL_SIZE, max_uses=MAX_USES):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = []
+        self._live = 0  # idle + leased sessions
+        self._cond = threading.Condition()
+        self._closed = False
+        self.created = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.leases = 0
+
+    def resize(self, size):
+        """Match the pool to the number of callers that use it at once."""
+        with self._cond:
+            self.size = max(1, size)
+            while self._live > self.size and self._idle:
+                self._quit(self._idle.pop())
+            self._cond.notify_all()
+
+    def _quit(self, session):
+        self._live -= 1
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("BrowserPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._live < self.size:
+                    self._live += 1
+                    break
+                self._cond.wait()
+        # Start the browser outside the lock, other callers can still get idle sessions
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return _Session(driver)
+
+    def _release(self, session, failed):
+        with self._cond:
+            session.uses += 1
+            if failed:
+                self.crashed += 1
+                self._quit(session)
+            elif self._closed or session.uses >= self.max_uses or self._live > self.size:
+                self.recycled += 1
+                self._quit(session)
+            else:
+                self._idle.append(session)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self):
+        """
+        A browser for the duration of the with block. Keep the block to page
+        loads, any exception raised in it retires the session.
+        """
+        session = self._acquire()
+        with self._cond:
+            self.leases += 1
+        failed = True
+        try:
+            yield session.driver
+            failed = False
+        finally:
+            self._release(session, failed)
+
+    def fetch(self, url):
+        """Page source of url from a pooled session."""
+        with self.lease() as driver:
+            driver.get(url)
+            return driver.page_source
+
+    def close(self):
+        """Quit idle sessions now and leased ones when they come back."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._quit(self._idle.pop())
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"created": self.created, "recycled": self.recycled, "crashed": self.crashed,
+                    "leases": self.leases, "live": self._live, "idle": len(self._idle)}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """The process-wide pool of Chrome sessions, closed at exit."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
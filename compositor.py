@@ -0,0 +1,368 @@
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+from PIL import Image
+from scipy.io import wavfile
+from frame_pipe import FrameReader, FrameWriter, is_video_path, map_ordered
+from motion import is_sprite_track, load_sprite_track, frame_state_runs
+from bounce import render_frame, worker_inputs as bounce_worker_inputs
+import render_pool
+from overlay_cache import OverlayCache, fit_overlay
+
+"""
+  Single-pass compositor: character (from bounce.py's sprite track, video
+  or frames), overlay visuals (from images.py's trigger timeline) and the
+  frame clock go in, each final RGBA frame is built once in memory and
+  handed to an encoder. With a background video the encoder is the final
+  ffmpeg pass itself (crop, burned-in subtitles, audio), so no intermediate
+  frames or videos are written at all.
+"""
+
+# The final encode flow.ps1 used to run on the frames
+FINAL_FILTER = "[0:v]crop=720:1080:(in_w-640)/2:(in_h-1080)/2,subtitles={subtitles}[vid];[vid][1:v]overlay=shortest=1[outv]"
+FINAL_FILTER_NO_SUBS = "[0:v]crop=720:1080:(in_w-640)/2:(in_h-1080)/2[vid];[vid][1:v]overlay=shortest=1[outv]"
+FINAL_OUTPUT_ARGS = [
+    "-map", "[outv]",
+    "-map", "2:a:0",
+    "-c:v", "h264_nvenc",
+    "-preset", "p7",
+    "-rc", "vbr",
+    "-cq", "19",
+    "-b:v", "0",
+    "-c:a", "aac",
+    "-b:a", "192k",
+    "-shortest",
+]
+
+# Process-wide, shared by the frame threads (or one per worker process)
+overlay_cache = OverlayCache()
+
+def overlay_frame(frame, t, trigger_images, W, H, frame_count, images=None):
+    """
+    Paste the first trigger image whose interval covers t onto frame, in place.
+    images optionally maps img_path -> already decoded RGBA image.
+    """
+    for start_ts, end_ts, img_path in trigger_images:
+        if img_path is None:
+            continue  # Skip if image path is None (failed generation)
+        if start_ts <= t <= end_ts:
+            try:
+                # Decoded and fitted once per image, not once per frame
+                source = images.get(img_path) if images is not None else None
+                top_img, offset = overlay_cache.get(img_path, W, H, source)
+            except Exception as e:
+                print(f"Error processing image {img_path}: {e}")
+                continue  # Skip this image if it can't be opened
+            try:
+                frame.paste(top_img, offset, top_img)
+                frame_count[0] += 1
+                break
+            except Exception as e:
+                print(f"Error processing image {img_path}: {e}")
+                continue  # Skip this image if any error occurs
+    return frame
+
+def load_overlays(trigger_images, W, H):
+    """
+    Decode every trigger image once and fit it to a W x H frame, keyed by
+    path. Unreadable ones are left out. Only the fitted images are kept (a
+    full size photo is let go as soon as it is fitted), so memory grows with
+    the overlay size, not with the downloaded resolution.
+    """
+    overlays = {}
+    for _, _, img_path in trigger_images:
+        if img_path is None or img_path in overlays:
+            continue
+        try:
+            with Image.open(os.path.normpath(img_path)) as img:
+                overlays[img_path], _ = fit_overlay(img.convert("RGBA"), W, H)
+        except Exception as e:
+            print(f"Error processing image {img_path}: {e}")
+    return overlays
+
+def build_overlay_timeline(frame_times, trigger_images):
+    """
+    Index into trigger_images of the overlay each frame shows, -1 for none.
+    First covering interval wins, like the scan in overlay_frame. Built once
+    with searchsorted over the (sorted) frame times instead of per frame.
+    """
+    frame_times = np.asarray(frame_times, dtype=np.float64)
+    frame_overlay = np.full(len(frame_times), -1, dtype=np.int64)
+    # Walk intervals last to first so earlier ones overwrite later ones
+    for idx in range(len(trigger_images) - 1, -1, -1):
+        start_ts, end_ts, img_path = trigger_images[idx]
+        if img_path is None:
+            continue
+        lo = np.searchsorted(frame_times, start_ts, side="left")
+        hi = np.searchsorted(frame_times, end_ts, side="right")
+        frame_overlay[lo:hi] = idx
+    return frame_overlay
+
+def _worker_trigger_images():
+    # Rebuild the (start, end, path) list once per worker from the shared timeline
+    state = render_pool.state
+    if "trigger_images" not in state:
+        timeline = state["timeline"]
+        state.setdefault("trigger_images", [
+            (float(start), float(end), path)
+            for start, end, path in zip(timeline["start"], timeline["end"], state["overlay_paths"])
+        ])
+    return state["trigger_images"]
+
+def superimpose_frame(task):
+    """
+    Superimpose an image onto frame i if within the trigger interval.
+    The base frame comes from the sprite track, the shared frame ring (decoded
+    video) or a frame PNG, and goes back to the ring or to a PNG.
+    task is (n, i): n is the frame's position in the output, which picks its
+    ring slot. Runs in a render_pool worker; returns (n, 1 if an image was pasted else 0).
+    """
+    n, i = task
+    state = render_pool.state
+    t = state["frame_times"]["t"][i]
+    overlay_idx = int(state["frame_times"]["overlay"][i])
+    W, H = state["overlay_size"]
+    source = state["source"]
+
+    # No overlay on this frame: pass it through without a decode/re-encode when possible
+    if overlay_idx < 0 and source != "sprite":
+        if source == "ring" and state["stream_output"]:
+            return n, 0  # already sitting in its output slot
+        if source != "ring" and not state["stream_output"]:
+            frame_path = os.path.normpath(os.path.join(source, f"frame_{i:04d}.png"))
+            output_path = os.path.normpath(os.path.join(state["output_dir"], f"frame_{i:04d}.png"))
+            if os.path.abspath(frame_path) != os.path.abspath(output_path) and os.path.exists(frame_path):
+                shutil.copyfile(frame_path, output_path)
+            return n, 0
+
+    if source == "sprite":
+        frame = render_frame(i, *bounce_worker_inputs())
+    elif source == "ring":
+        frame = Image.frombytes("RGBA", state["frame_size"], bytes(render_pool.slot("frames", n)))
+    else:
+        frame_path = os.path.join(source, f"frame_{i:04d}.png")
+        try:
+            frame = Image.open(os.path.normpath(frame_path)).convert("RGBA")
+        except Exception as e:
+            print(f"Error opening frame {frame_path}: {e}")
+            return n, 0
+
+    frame_count = [0]
+    if overlay_idx >= 0:
+        # Scan from the indexed interval so a failed image still falls through to the next one
+        overlay_frame(frame, t, _worker_trigger_images()[overlay_idx:], W, H, frame_count, state["overlays"])
+
+    if state["stream_output"]:
+        render_pool.slot("frames", n)[:] = frame.tobytes()
+    else:
+        output_path = os.path.normpath(os.path.join(state["output_dir"], f"frame_{i:04d}.png"))
+        frame.save(output_path)
+    return n, frame_count[0]
+
+def escape_filter_path(path):
+    """Quote a file path for use inside an ffmpeg filtergraph option."""
+    path = path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+    return f"'{path}'"
+
+def final_video_writer(output_path, background, wav_path, start=0, duration=None, subtitles=None):
+    """
+    Writer factory for the final mp4: background clip + our frames on stdin +
+    audio, with the subtitles burned in, all in the one ffmpeg process.
+    """
+    def make_writer(W, H, fps):
+        pre_inputs = ["-ss", str(start)]
+        if duration is not None:
+            pre_inputs += ["-t", str(duration)]
+        pre_inputs += ["-i", background]
+        if subtitles:
+            filter_complex = FINAL_FILTER.format(subtitles=escape_filter_path(subtitles))
+        else:
+            filter_complex = FINAL_FILTER_NO_SUBS
+        return FrameWriter(
+            output_path, W, H, fps,
+            pre_inputs=pre_inputs,
+            post_inputs=["-i", wav_path],
+            output_args=["-filter_complex", filter_complex, *FINAL_OUTPUT_ARGS],
+        )
+    return make_writer
+
+def link_frame(src_path, dst_path):
+    """Hard-link a duplicate frame, copying if the filesystem can't link."""
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
+def write_concat_list(path, frame_names, lengths, fps):
+    """ffconcat list showing each unique frame for its run's duration."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("ffconcat version 1.0\n")
+        for name, length in zip(frame_names, lengths):
+            f.write(f"file '{name}'\nduration {length / fps:.6f}\n")
+        if frame_names:
+            # The concat demuxer ignores the last duration unless the file is repeated
+            f.write(f"file '{frame_names[-1]}'\n")
+
+def composite(frames_source, trigger_images, frame_times, output=None, make_writer=None,
+              W=720, H=1080, fps=30, executor_kind="process", workers=None, runs="link"):
+    """
+    Build every output frame once and send it to the encoder.
+
+    frames_source: bounce.py output, a --sprite_track dir, a video or a frames dir
+    trigger_images: [(start, end, img_path), ...] from images.py
+    frame_times: time of each frame (ignored for sprite tracks, which carry their own)
+    output: frames dir or .mov/.mkv/.webm path; or pass make_writer(W, H, fps)
+        returning a FrameWriter, e.g. final_video_writer(...)
+    runs: for sprite tracks, render each run of identical frames once.
+        Streams repeat the rendered frame, frame dirs get the duplicates as
+        hard links ("link") or only unique frames plus frames.ffconcat with
+        durations ("concat"). None renders every frame.
+    Returns the number of frames that got an overlay.
+    """
+    workers = workers or render_pool.default_workers()
+    window = 2 * workers
+    if make_writer is None and is_video_path(output):
+        make_writer = lambda fw, fh, rate: FrameWriter(output, fw, fh, rate)
+    stream_output = make_writer is not None
+    if not stream_output:
+        os.makedirs(output, exist_ok=True)
+    num_frames = len(frame_times)
+
+    with render_pool.SharedStore(use_shm=executor_kind == "process") as store:
+        # Overlays are decoded and fitted once here and shared, workers only get
+        # frame indices (fitting an already fitted overlay again is a no-op)
+        overlays = load_overlays(trigger_images, W, H)
+        store.add_images("overlays", overlays)
+        store.add_arrays("timeline", {
+            "start": np.array([start for start, _, _ in trigger_images], dtype=np.float64),
+            "end": np.array([end for _, end, _ in trigger_images], dtype=np.float64),
+        })
+        store.add_value("overlay_paths", [img_path for _, _, img_path in trigger_images])
+        store.add_value("overlay_size", (W, H))
+        store.add_value("stream_output", stream_output)
+        store.add_value("output_dir", output)
+
+        reader = None
+        run_lengths = None
+        if is_sprite_track(frames_source):
+            # bounce.py --sprite_track output: draw the character from its track
+            # here instead of reading pre-rendered frames
+            track, sprite = load_sprite_track(frames_source)
+            frame_times = track["t"]
+            fps = track["fps"]
+            frame_size = (track["W"], track["H"])
+            frame_indices = range(len(frame_times))
+            store.add_value("source", "sprite")
+            store.add_image("sprite", sprite)
+            store.add_arrays("track", {key: track[key] for key in ("scale", "x", "y")})
+            store.add_value("scale_step", 1/256)
+        elif is_video_path(frames_source):
+            # bounce.py video output, decoded frames go through the shared ring
+            reader = FrameReader(frames_source)
+            frame_size = (reader.W, reader.H)
+            frame_indices = range(num_frames)
+            store.add_value("source", "ring")
+        else:
+            frame_indices = [i for i in range(num_frames)
+                             if os.path.exists(os.path.join(frames_source, f"frame_{i:04d}.png"))]
+            frame_size = Image.open(os.path.join(frames_source, f"frame_{frame_indices[0]:04d}.png")).size if frame_indices else (W, H)
+            store.add_value("source", frames_source)
+        frame_overlay = build_overlay_timeline(frame_times, trigger_images)
+        if runs and is_sprite_track(frames_source):
+            # Frames are identical while position, sprite size and overlay don't change
+            run_starts, run_lengths = frame_state_runs(track, 1/256, frame_overlay)
+            frame_indices = run_starts.tolist()
+            print(f"Rendering {len(run_starts)} unique frames for {len(frame_times)} output frames")
+        store.add_value("frame_size", frame_size)
+        store.add_arrays("frame_times", {
+            "t": np.asarray(frame_times, dtype=np.float64),
+            "overlay": frame_overlay,
+        })
+        if stream_output or reader is not None:
+            store.add_ring("frames", window, frame_size[0] * frame_size[1] * 4)
+
+        def tasks():
+            # Output position n's ring slot is free by the time it is submitted (map_ordered window)
+            if reader is None:
+                yield from enumerate(frame_indices)
+                return
+            for n, (i, frame_bytes) in enumerate(zip(frame_indices, reader.iter_bytes())):
+                store.slot("frames", n)[:] = frame_bytes
+                yield n, i
+
+        # How many output frames each task stands for (1 unless runs were detected)
+        repeats = run_lengths.tolist() if run_lengths is not None else None
+
+        frame_count = 0
+        try:
+            with render_pool.make_executor(executor_kind, store.spec(), workers) as executor:
+                if stream_output:
+                    with make_writer(frame_size[0], frame_size[1], fps) as writer:
+                        for n, pasted in map_ordered(executor, superimpose_frame, tasks(), window):
+                            repeat = repeats[n] if repeats else 1
+                            for _ in range(repeat):
+                                writer.write(store.slot("frames", n))
+                            frame_count += pasted * repeat
+                else:
+                    for n, pasted in map_ordered(executor, superimpose_frame, tasks(), window):
+                        repeat = repeats[n] if repeats else 1
+                        frame_count += pasted * repeat
+                        if repeat > 1 and runs == "link":
+                            i = frame_indices[n]
+                            first = os.path.join(output, f"frame_{i:04d}.png")
+                            for j in range(i + 1, i + repeat):
+                                link_frame(first, os.path.join(output, f"frame_{j:04d}.png"))
+                    if repeats and runs == "concat":
+                        write_concat_list(os.path.join(output, "frames.ffconcat"),
+                                          [f"frame_{i:04d}.png" for i in frame_indices], repeats, fps)
+        finally:
+            if reader is not None:
+                reader.close()
+    return frame_count
+
+def save_trigger_images(trigger_images, path):
+    """Write the trigger timeline images.py resolved, for compositor.py to read back."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([list(entry) for entry in trigger_images], f, indent=2)
+
+def load_trigger_images(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [tuple(entry) for entry in json.load(f)]
+
+def wav_frame_times(wav_path, fps=30):
+    """The frame clock: one timestamp per frame over the wav's duration."""
+    sr, data = wavfile.read(wav_path)
+    duration = len(data) / sr
+    return np.linspace(0, duration, int(duration * fps))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Composite character, visuals and subtitles into the final frames or video.")
+    parser.add_argument("frames_source", help="bounce.py output: --sprite_track dir, video or frames dir")
+    parser.add_argument("triggers", help="Trigger timeline JSON written by images.py")
+    parser.add_argument("wav_path", help="Audio, for the frame clock and the final video's sound")
+    parser.add_argument("output", help="Frames dir, .mov/.mkv/.webm, or the final .mp4 when --background is given")
+    parser.add_argument("--background", help="Background video, makes this the final encode")
+    parser.add_argument("--start", type=float, default=0, help="Start time in the background video")
+    parser.add_argument("--duration", type=float, default=None, help="Length of background to use")
+    parser.add_argument("--subtitles", help="ASS subtitles to burn in (final encode only)")
+    parser.add_argument("--runs", choices=("link", "concat", "none"), default="link",
+                        help="Render repeated frames once: hard-link duplicates, or write frames.ffconcat with durations")
+    parser.add_argument("--executor", choices=("process", "thread"), default="process")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    make_writer = None
+    if args.background:
+        make_writer = final_video_writer(args.output, args.background, args.wav_path,
+                                         args.start, args.duration, args.subtitles)
+    frame_count = composite(
+        args.frames_source, load_trigger_images(args.triggers), wav_frame_times(args.wav_path),
+        output=args.output, make_writer=make_writer,
+        executor_kind=args.executor, workers=args.workers,
+        runs=None if args.runs == "none" else args.runs,
+    )
+    print(f"Compositing complete. Total frames with superimposed images: {frame_count}")
@@ -0,0 +1,98 @@
+import os
+from functools import lru_cache
+import numpy as np
+from scipy.io import wavfile
+
+"""
+  Audio envelope helpers shared by bounce.py and anything else that needs
+  pauses or loudness from a wav. Everything here is a single NumPy pass over
+  the samples (reshape for windows, cumsum for ranges), no per-window Python.
+"""
+
+def _read_mono(wav_path):
+    """Read a wav as mono float64 normalized to [-1, 1]. Works for int and float wavs."""
+    sr, data = wavfile.read(wav_path)
+    if data.ndim > 1:
+        data = data.mean(axis=1)  # mono
+    data = np.asarray(data, dtype=np.float64)
+    peak = np.max(np.abs(data)) if len(data) else 0.0
+    if peak > 0:
+        data = data / peak
+    return sr, data
+
+@lru_cache(maxsize=4)
+def _load_mono_cached(wav_path, mtime):
+    sr, data = _read_mono(wav_path)
+    data.setflags(write=False)  # shared between callers, don't let anyone mutate it
+    return sr, data
+
+def load_mono(wav_path):
+    """Cached version of _read_mono, keyed by path and mtime so a rewritten wav is re-read."""
+    wav_path = os.path.abspath(wav_path)
+    return _load_mono_cached(wav_path, os.path.getmtime(wav_path))
+
+def windowed_rms(data, frame_size):
+    """
+    RMS of consecutive non-overlapping windows of frame_size samples.
+    Window count matches the old range(0, len(data)-frame_size, frame_size) loop.
+    """
+    n_windows = max((len(data) - 1) // frame_size, 0) if frame_size > 0 else 0
+    if n_windows == 0:
+        return np.zeros(0, dtype=np.float64)
+    windows = data[:n_windows * frame_size].reshape(n_windows, frame_size)
+    return np.sqrt(np.einsum('ij,ij->i', windows, windows) / frame_size)
+
+def pause_mask(energies, pause_thresh=0.05):
+    """Boolean array, True for windows quieter than pause_thresh."""
+    return energies < pause_thresh
+
+def segments_from_mask(pauses, hop, sr, n_samples):
+    """
+    Turn a per-window pause mask into (start, end) speech segments in seconds.
+    Returns an (N, 2) float array with the same boundaries the old loop produced.
+    """
+    pauses = np.asarray(pauses, dtype=bool)
+    prev = np.concatenate(([False], pauses[:-1]))
+    onsets = np.flatnonzero(pauses & ~prev) * hop / sr   # speech -> pause
+    offsets = np.flatnonzero(~pauses & prev) * hop / sr  # pause -> speech
+    duration = n_samples / sr
+
+    # Onsets and offsets alternate, so the speech that ends at onset k started
+    # at 0 (k == 0) or at offset k-1
+    starts = np.concatenate(([0.0], offsets[:len(onsets) - 1])) if len(onsets) else np.zeros(0)
+    keep = onsets > starts
+    segments = np.column_stack((starts[keep], onsets[keep]))
+
+    last_start = offsets[-1] if len(offsets) else 0.0
+    if last_start < duration:
+        segments = np.vstack((segments, [[last_start, duration]]))
+    return segments.reshape(-1, 2)
+
+def segment_volumes(data, sr, segments):
+    """RMS volume of each (start, end) segment using one cumulative sum of squares."""
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2)
+    if len(segments) == 0:
+        return np.zeros(0, dtype=np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(data * data)))
+    s = np.clip((segments[:, 0] * sr).astype(np.int64), 0, len(data))
+    e = np.clip((segments[:, 1] * sr).astype(np.int64), 0, len(data))
+    length = e - s
+    volumes = np.zeros(len(segments), dtype=np.float64)
+    has_samples = length > 0
+    volumes[has_samples] = np.sqrt(
+        np.maximum(csum[e[has_samples]] - csum[s[has_samples]], 0) / length[has_samples]
+    )
+    return volumes
+
+def analyze(wav_path, pause_thresh=0.05, window=0.02):
+    """
+    Everything bounce.py needs from the audio in one go.
+    Returns (sr, energies, pauses, segments, volumes) as NumPy arrays.
+    """
+    sr, data = load_mono(wav_path)
+    frame_size = int(window * sr)
+    energies = windowed_rms(data, frame_size)
+    pauses = pause_mask(energies, pause_thresh)
+    segments = segments_from_mask(pauses, frame_size, sr, len(data))
+    volumes = segment_volumes(data, sr, segments)
+    return sr, energies, pauses, segments, volumes
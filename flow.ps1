@@ -57,7 +57,13 @@ $srtPath = Join-Path $outputDir "output.srt"
 $assPath = Join-Path $outputDir "subtitles.ass"
 
 if (Test-Path $wavPath) {
-    Invoke-Expression "python transcriber.py `"$wavPath`" `"$srtPath`""
+    if ($env:TRANSCRIBE_SPOOL) {
+        # A warm transcriber.py --serve is running (single.ps1 starts one), hand it the job
+        Invoke-Expression "python transcriber.py --submit `"$env:TRANSCRIBE_SPOOL`" `"$wavPath`" `"$srtPath`" --script `"$script`""
+    } else {
+        # The TTS read $script word for word, so align it rather than decode the audio
+        Invoke-Expression "python transcriber.py `"$wavPath`" `"$srtPath`" --script `"$script`""
+    }
 } else {
     Write-Warning "Expected audio file '$wavPath' not found. Skipping transcription."
     exit 1
@@ -70,11 +76,11 @@ if (Test-Path $srtPath) {
     exit 1
 }
 
-# Create frames directory inside the output folder
-$framesDir = Join-Path $outputDir "frames"
-if (-not (Test-Path $framesDir)) {
-    New-Item -ItemType Directory -Path $framesDir | Out-Null
-}
+# bounce.py writes only the character sprite and its motion track here,
+# images.py resolves the visuals into triggers.json, and compositor.py draws
+# both straight into the final ffmpeg encode
+$spriteTrackDir = Join-Path $outputDir "sprite"
+$triggersPath = Join-Path $outputDir "triggers.json"
 
 # Create image cache directory inside the output folder
 $cacheDir = Join-Path $outputDir "cache"
@@ -85,18 +91,23 @@ if (-not (Test-Path $cacheDir)) {
 
 # Usage: python =
 # Use the script with curly brackets for integrated.py
-Invoke-Expression "python bounce.py `"$imagePath`" `"$framesDir`" `"$wavInferPath`""
+Invoke-Expression "python bounce.py `"$imagePath`" `"$spriteTrackDir`" `"$wavInferPath`" --sprite_track"
 
 $script = $script -replace '\\', '/'
 $srtPath = $srtPath -replace '\\', '/'
 $wavPath = $wavPath -replace '\\', '/'
-$framesDir = $framesDir -replace '\\', '/'
+$spriteTrackDir = $spriteTrackDir -replace '\\', '/'
+$triggersPath = $triggersPath -replace '\\', '/'
 $cacheDir = $cacheDir -replace '\\', '/'
 $outputDir = $outputDir -replace '\\', '/'
 
-# python images.py <subtitles.srt> <wav_path> <input_frames_dir> <cache_dir> <output_dir> <video_name>
+# python make_visuals.py <subtitles.srt> <wav_path> <input_frames_dir> <cache_dir> <output_dir> <video_name>
 # Execute the command
-$cmd = "python images.py `"$srtPath`" `"$wavPath`" `"$framesDir`" `"$cacheDir`" `"$framesDir`" `"$baseName`""
+$cmd = "python make_visuals.py `"$srtPath`" `"$wavPath`" `"$spriteTrackDir`" `"$cacheDir`" `"$triggersPath`" `"$baseName`""
+if ($env:VISUALS_SPOOL) {
+    # A warm make_visuals.py --serve is running (single.ps1 starts one), its browsers serve the whole batch
+    $cmd += " --submit `"$env:VISUALS_SPOOL`""
+}
 
 Write-Host "Executing command: $cmd"
 
@@ -142,50 +153,20 @@ if ($inputDurationNum -le $durationPlusOne) {
 }
 # Overlay frames, add audio, output to final.mp4
 $finalVideo = Join-Path $outputDir "final.mp4"
-$framesPattern = Join-Path $framesDir "frame_%04d.png"
-
-# Escape and quote paths for ffmpeg
-$escapedAssPath = $assPath -replace '\\', '\\\\' -replace "'", "'\\''"
-$quotedAssPath = "`"$escapedAssPath`""
-$quotedInputVideo = "`"$inputVideo`""
-$quotedFramesPattern = "`"$framesPattern`""  # Sequential frame pattern
-$quotedWavPath = "`"$wavPath`""
-$quotedFinalVideo = "`"$finalVideo`""
 
 Write-Host "Start Time: $startTime"
 Write-Host "Duration: $durationPlusOne"
-Write-Host "Input Video: $quotedInputVideo"
-Write-Host "Frames Pattern: $quotedFramesPattern"
-Write-Host "WAV Path: $quotedWavPath"
-Write-Host "Subtitles Path: $quotedAssPath"
-Write-Host "Final Video: $quotedFinalVideo"
-
-# Use -filter_complex for multiple inputs
-$filterComplex = "[0:v]crop=720:1080:(in_w-640)/2:(in_h-1080)/2,subtitles=$quotedAssPath[vid];[vid][1:v]overlay=shortest=1[outv]"
-
-$arguments = @(
-    '-y'
-    '-ss', "$startTime"
-    '-t', "$durationPlusOne"
-    '-i', $quotedInputVideo
-    '-framerate', '30'
-    '-i', $quotedFramesPattern  # Use sequential frame pattern
-    '-i', $quotedWavPath
-    '-filter_complex', $filterComplex
-    '-map', '[outv]'
-    '-map', '2:a:0'
-    '-c:v', 'h264_nvenc'
-    '-preset', 'p7'
-    '-rc', 'vbr'
-    '-cq', '19'
-    '-b:v', '0'
-    '-c:a', 'aac'
-    '-b:a', '192k'
-    '-shortest'
-    $quotedFinalVideo
-)
-
-Start-Process -NoNewWindow -Wait -FilePath "ffmpeg" -ArgumentList $arguments
+Write-Host "Input Video: $inputVideo"
+Write-Host "Triggers: $triggersPath"
+Write-Host "WAV Path: $wavPath"
+Write-Host "Subtitles Path: $assPath"
+Write-Host "Final Video: $finalVideo"
+
+# Character, visuals and subtitles over the background in one pass, frames
+# go from compositor.py to ffmpeg in memory
+$cmd = "python compositor.py `"$spriteTrackDir`" `"$triggersPath`" `"$wavPath`" `"$finalVideo`" --background `"$inputVideo`" --start $startTime --duration $durationPlusOne --subtitles `"$assPath`""
+Write-Host "Executing command: $cmd"
+Invoke-Expression $cmd
 
 
 # Copy final video to ./videos/ using subfolder name
@@ -0,0 +1,144 @@
+import os
+import json
+import subprocess
+from collections import deque
+from PIL import Image
+
+"""
+  Raw RGBA frame pipes to and from ffmpeg.
+  bounce.py and images.py use these when given a video path instead of a
+  frames directory, so frames go straight through stdin/stdout in order and
+  no PNGs are written in between.
+"""
+
+# Lossless codecs that keep the alpha channel, picked by output extension
+VIDEO_CODECS = {
+    ".mov": ["-c:v", "qtrle"],
+    ".mkv": ["-c:v", "ffv1", "-pix_fmt", "bgra"],
+    ".webm": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-lossless", "1"],
+}
+
+def is_video_path(path):
+    """True if path names a video file we can stream frames to/from, not a frames directory."""
+    return os.path.splitext(str(path))[1].lower() in VIDEO_CODECS
+
+def probe_video_size(path, ffprobe="ffprobe"):
+    """(width, height) of the first video stream."""
+    out = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height", "-of", "json", path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    stream = json.loads(out)["streams"][0]
+    return int(stream["width"]), int(stream["height"])
+
+class FrameWriter:
+    """
+    Encode RGBA frames written in order to a video file through ffmpeg's stdin.
+    Writes block when ffmpeg falls behind, which is the backpressure for the
+    renderers feeding it.
+    """
+    def __init__(self, path, W, H, fps=30, ffmpeg="ffmpeg", pre_inputs=(), post_inputs=(), output_args=None):
+        """
+        pre_inputs/post_inputs: extra ffmpeg inputs before/after the frames on stdin
+        output_args: replaces the default lossless codec args, e.g. for a final encode
+        """
+        self.path = path
+        self.W, self.H = W, H
+        self.frame_bytes = W * H * 4
+        self.frames_written = 0
+        if output_args is None:
+            output_args = VIDEO_CODECS.get(os.path.splitext(path)[1].lower(), VIDEO_CODECS[".mov"])
+        out_dir = os.path.dirname(path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        self.proc = subprocess.Popen(
+            [ffmpeg, "-y", "-loglevel", "error", *pre_inputs,
+             "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{W}x{H}", "-r", str(fps),
+             "-i", "-", *post_inputs, *output_args, path],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, frame):
+        """Write one frame, either a PIL image or raw RGBA bytes (any bytes-like object)."""
+        if isinstance(frame, Image.Image):
+            if frame.mode != "RGBA":
+                frame = frame.convert("RGBA")
+            frame = frame.tobytes()
+        if len(frame) != self.frame_bytes:
+            raise ValueError(f"Frame is {len(frame)} bytes, expected {self.frame_bytes} for {self.W}x{self.H} RGBA")
+        try:
+            self.proc.stdin.write(frame)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited early while writing {self.path} (code {self.proc.wait()})")
+        self.frames_written += 1
+
+    def close(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        code = self.proc.wait()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self.path} (code {code})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.proc.kill()
+            self.proc.wait()
+            return False
+        self.close()
+
+class FrameReader:
+    """Decode a video into RGBA PIL frames, in order, through ffmpeg's stdout."""
+    def __init__(self, path, ffmpeg="ffmpeg", ffprobe="ffprobe"):
+        self.path = path
+        self.W, self.H = probe_video_size(path, ffprobe)
+        self.frame_bytes = self.W * self.H * 4
+        self.proc = subprocess.Popen(
+            [ffmpeg, "-loglevel", "error", "-i", path, "-f", "rawvideo", "-pix_fmt", "rgba", "-"],
+            stdout=subprocess.PIPE,
+        )
+
+    def iter_bytes(self):
+        """Raw RGBA bytes of each frame."""
+        while True:
+            buf = self.proc.stdout.read(self.frame_bytes)
+            if len(buf) < self.frame_bytes:
+                break
+            yield buf
+
+    def __iter__(self):
+        for buf in self.iter_bytes():
+            yield Image.frombytes("RGBA", (self.W, self.H), buf)
+
+    def close(self):
+        self.proc.stdout.close()
+        self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.proc.kill()
+        self.close()
+        return False
+
+def map_ordered(executor, fn, items, window=32):
+    """
+    Like executor.map, but keeps at most `window` tasks in flight and yields
+    results in submission order. Consumers that block (e.g. a FrameWriter)
+    therefore throttle rendering instead of letting finished frames pile up.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -1,9 +1,10 @@
 import os
-from time import sleep
 import argparse
 import google.generativeai as genai
 from openai import OpenAI
 import re
+import llm_cache
+from llm_client import LLMClient
 # Set OpenAI API key from environment variable
 """client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
@@ -21,15 +22,16 @@ def ai_text(p):
         return ai_text(p)
 """
 genai.configure(api_key=open('api.txt', 'r').read())
-model = genai.GenerativeModel("gemini-2.5-flash")
+MODEL = "gemini-2.5-flash"
+# Bump when the prompt template or the post-processing below changes
+PROMPT_VERSION = 1
+model = genai.GenerativeModel(MODEL)
+
+llm = LLMClient(lambda p: model.generate_content(p).text)
 
 def ai_text(p):
-    try:
-        return model.generate_content(p).text
-    except Exception as e:
-        print(f'Error: {e}')
-        sleep(5)
-        return ai_text(p)
+    """Gemini response for p, from the response cache when it has been asked before."""
+    return llm_cache.cached(MODEL, p, lambda: llm.generate(p), version=PROMPT_VERSION)
     
 def construct_prompt(topic_file, character_file):
     return open('./prompts/single_prompt.txt', 'r', encoding='utf-8').read().format(
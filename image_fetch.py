@@ -0,0 +1,129 @@
+import os
+import threading
+import concurrent.futures
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import ImageFile
+
+"""
+  Picking and downloading the best image search candidate for images.py.
+  Candidates are probed in parallel over one pooled requests.Session (on one
+  process-wide probe pool, however many prompts are resolved at once), each
+  reading just enough of the file (a Range request for the first few KB) for
+  Pillow to parse the header and report the pixel size. Only the winner is
+  downloaded in full, into memory, and written to its final path atomically,
+  so concurrent prompts never share temp files.
+"""
+
+PROBE_WORKERS = 8  # probes in flight across all callers
+MAX_DOWNLOADS = 8  # whole-image downloads in flight, images.py's IO_WORKERS
+PROBE_BYTES = 64 * 1024   # enough for the header of PNG/GIF/WebP and most JPEGs
+MAX_IMAGE_BYTES = 32 * 1024 * 1024
+TIMEOUT = 10
+
+_session = None
+_probe_executor = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Process-wide Session whose connection pool covers every probe and download in flight."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            pool_size = PROBE_WORKERS + MAX_DOWNLOADS
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers["User-Agent"] = "Mozilla/5.0"
+        return _session
+
+def get_probe_executor():
+    """Process-wide thread pool every rank_candidates call probes on."""
+    global _probe_executor
+    with _session_lock:
+        if _probe_executor is None:
+            _probe_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+        return _probe_executor
+
+def probe_image_size(url, session=None, max_bytes=PROBE_BYTES):
+    """
+    (width, height) of the image at url from its first bytes, or None if it
+    isn't an image or the header doesn't fit in max_bytes.
+    """
+    session = session or get_session()
+    headers = {"Range": f"bytes=0-{max_bytes - 1}"}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code not in (200, 206):
+            return None
+        if "image" not in response.headers.get("content-type", "").lower():
+            return None
+        # Servers that ignore Range send the whole file, stop reading at max_bytes
+        parser = ImageFile.Parser()
+        read = 0
+        for chunk in response.iter_content(8192):
+            parser.feed(chunk)
+            if parser.image is not None:
+                return parser.image.size
+            read += len(chunk)
+            if read >= max_bytes:
+                break
+    return None
+
+def download_image(url, session=None, max_bytes=MAX_IMAGE_BYTES):
+    """Whole image at url as bytes, or None if it isn't an image."""
+    session = session or get_session()
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code != 200:
+            return None
+        if "image" not in response.headers.get("content-type", "").lower():
+            return None
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                return None
+    return bytes(data)
+
+def rank_candidates(urls, session=None, executor=None):
+    """Candidate urls by pixel count, largest first. Unprobeable ones go last, in their original order."""
+    session = session or get_session()
+    executor = executor or get_probe_executor()
+    def area(url):
+        try:
+            size = probe_image_size(url, session)
+        except Exception:
+            return 0  # a probe that raised (timeout, reset) may still download, rank it with the unprobeable
+        if size is None:
+            return 0
+        return size[0] * size[1]
+    # Shared with the other prompts' probes, so at most PROBE_WORKERS connections probe at once
+    areas = list(executor.map(area, urls))
+    order = sorted(range(len(urls)), key=lambda i: -areas[i])  # stable, ties keep search order
+    return [urls[i] for i in order]
+
+def write_atomic(path, data):
+    """Write data to path via a temp file in the same directory, so readers never see half a file."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def fetch_largest_image(urls, local_path, session=None):
+    """
+    Save the candidate with the most pixels to local_path. Falls through to
+    the next best if the winner fails to download. Returns local_path or None.
+    """
+    session = session or get_session()
+    for url in rank_candidates(urls, session):
+        try:
+            data = download_image(url, session)
+        except Exception:
+            continue
+        if data:
+            write_atomic(local_path, data)
+            return os.path.normpath(local_path)
+    return None
@@ -1,111 +1,76 @@
-import sys
 import re
 import json
+import argparse
 from typing import List, Tuple
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
 from scipy.io import wavfile
 import concurrent.futures
-from difflib import SequenceMatcher
+import multiprocessing
 from google_images_search import GoogleImagesSearch
-import matplotlib.pyplot as plt
-from matplotlib import rc
 import os
-from wand.image import Image as WandImage
 from google import genai
 from google.genai import types
 import os
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from bs4 import BeautifulSoup
 import time
 import urllib.parse
-import hashlib
-
-# Configure Google Gemini API
-client = genai.Client(api_key=open('api.txt', 'r').read())
+from compositor import composite, save_trigger_images, wav_frame_times
+from trigger_matcher import PhraseMatcher
+import llm_cache
+from llm_client import LLMClient
+import spool
+from render_pool import default_workers, process_workers
+from browser_pool import get_pool
+from image_fetch import fetch_largest_image
+from asset_store import get_store, store_key, link_or_copy
+from renderers import generate_text_image, equation_asset, text_asset
+from svg_raster import SvgRasterizer, get_rasterizer
+
+MODEL = "gemini-2.5-flash"
+# Bump when prompt templates or response post-processing change, so cached
+# responses recorded for the old ones are not reused
+PROMPT_VERSION = 1
+
+_client = None
+_llm = None
+
+def get_client():
+    """The Gemini client, configured on first use (not at import, which spawned workers repeat)."""
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=open('api.txt', 'r').read())
+    return _client
+
+def get_llm():
+    """The LLMClient all Gemini requests go through, started on first use."""
+    global _llm
+    if _llm is None:
+        _llm = LLMClient(gemini_generate)
+    return _llm
+
+def gemini_generate(p, think=-1):
+    """One Gemini request, no retries (LLMClient does those)."""
+    client = get_client()
+    if think > 1:
+        return client.models.generate_content(
+            model=MODEL,
+            contents=p,
+            config=types.GenerateContentConfig(
+                thinking_config=types.ThinkingConfig(thinking_budget=think)
+                # Turn off thinking:
+                # thinking_config=types.ThinkingConfig(thinking_budget=0)
+                # Turn on dynamic thinking:
+                # thinking_config=types.ThinkingConfig(thinking_budget=-1)
+            ),
+        ).text
+    else:
+        return client.models.generate_content(contents=p,model=MODEL).text
 
-def ai_text(p, think=-1):
-    """Generate text using Gemini API with retry logic."""
-    try:
-        if think > 1:
-            return client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=p,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=think)
-                    # Turn off thinking:
-                    # thinking_config=types.ThinkingConfig(thinking_budget=0)
-                    # Turn on dynamic thinking:
-                    # thinking_config=types.ThinkingConfig(thinking_budget=-1)
-                ),
-            ).text
-        else:
-            return client.models.generate_content(contents=p,model="gemini-2.5-flash").text
-    except Exception as e:
-        print(f'Error in ai_text: {e}')
-        time.sleep(5)
-        return ai_text(p, think)
-
-def shorten_filename(filename):
-    """Shorten a filename using a hash to avoid errors."""
-    max_length = 255  # Typical max filename length for most filesystems
-    if len(filename) > max_length:
-        # Use a hash of the filename to shorten it
-        hash_part = hashlib.md5(filename.encode()).hexdigest()
-        # Keep the extension and shorten the rest
-        name, ext = os.path.splitext(filename)
-        filename = f"{name[:max_length - len(hash_part) - len(ext) - 1]}_{hash_part}{ext}"
-    return filename
-
-def render_latex_to_png(equation, output_file="equation.png", fontsize=12, dpi=300):
+def ai_text(p, think=-1, validate=None):
     """
-    Render a LaTeX equation to a PNG image.
-    
-    Parameters:
-    - equation (str): LaTeX equation string (e.g., r'\frac{1}{2} + \sqrt{x^2}').
-    - output_file (str): Path to save the PNG file (default: 'equation.png').
-    - fontsize (int): Font size for the equation (default: 12).
-    - dpi (int): Resolution of the output image (default: 300).
+    Generate text using Gemini API, answered from the response cache when possible.
+    Raises LLMError if the request keeps failing.
     """
-    # Shorten the output filename if necessary
-    output_file = shorten_filename(output_file)
-
-    # Use matplotlib's built-in mathtext (no external LaTeX required)
-    rc('text', usetex=False)
-    rc('font', family='serif')
-
-    # Strip leading/trailing $ and $$ from equation string
-    eq = equation.strip()
-    eq = re.sub(r'^(\${1,2})', '', eq)
-    eq = re.sub(r'(\${1,2})$', '', eq)
-
-    # Create a figure with no axes
-    fig, ax = plt.subplots(figsize=(4, 1))
-    ax.axis('off')  # Hide axes
-
-    # Add a white rectangle as background for the equation
-    fig.patch.set_facecolor('white')
-    ax.set_facecolor('white')
-    # Render the LaTeX equation with a white box
-    text_obj = ax.text(0.5, 0.5, f"${eq}$", fontsize=fontsize, ha='center', va='center', zorder=2)
-    # Draw a white rectangle behind the text
-    fig.canvas.draw()
-    bbox = text_obj.get_window_extent(renderer=fig.canvas.get_renderer())
-    inv = ax.transData.inverted()
-    bbox_data = bbox.transformed(inv)
-    rect = plt.Rectangle((bbox_data.x0, bbox_data.y0), bbox_data.width, bbox_data.height,
-                        color='white', zorder=1)
-    ax.add_patch(rect)
-    # Redraw text on top
-    ax.draw_artist(text_obj)
-
-    # Save the figure as a PNG with high DPI
-    plt.savefig(output_file, format='png', dpi=dpi, bbox_inches='tight', transparent=False)
-    plt.close(fig)
-
-    print(f"Equation rendered and saved as {output_file}")
+    return llm_cache.cached(MODEL, p, lambda: get_llm().generate(p, think=think), think=think, version=PROMPT_VERSION, validate=validate)
 
 def timestamp_to_seconds(ts: str) -> float:
     """Convert SRT timestamp (HH:MM:SS,mmm) to seconds."""
@@ -147,6 +112,14 @@ def srt_to_raw_script(srt_text: str) -> str:
     raw_script_lines = [lines[i].strip() for i in range(2, len(lines), 4) if lines[i].strip()]
     return "\n".join(raw_script_lines)
 
+def is_timings_json(response: str) -> bool:
+    """True if a timing response parses once the code fence is stripped."""
+    try:
+        json.loads(response.replace("`json", '').replace("`", ""))
+        return True
+    except json.JSONDecodeError:
+        return False
+
 def create_prompt(script: str) -> str:
     """Create prompt for AI to generate image search prompts."""
     return open('./prompts/timing_gen_prompt.txt', 'r', encoding='utf-8').read().format(
@@ -158,10 +131,6 @@ def create_prompt(script: str) -> str:
  - For "diagram": a brief description of the diagram needed (e.g., "strong acid weak base titration curve"). Use this option sparingly, only when a diagram is necessary and an image search is insufficient. 
  """
 
-def similarity(a: str, b: str) -> float:
-    """Calculate similarity between two strings using SequenceMatcher."""
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
-
 def get_trigger_intervals(srt_text: str, timings: str, default_image_duration: float = 3, similarity_threshold: float = 0.5) -> List[Tuple[float, float, str]]:
     """Map image prompts to subtitle timestamps using substring and fuzzy matching."""
     srt_entries = parse_srt(srt_text)
@@ -173,25 +142,12 @@ def get_trigger_intervals(srt_text: str, timings: str, default_image_duration: f
         print(f"Error: Invalid JSON in timings: {e}. Returning empty intervals.")
         return []
 
+    matcher = PhraseMatcher(prompt_dict, similarity_threshold)
     intervals = []
     unmatched_phrases = []
     for start, end, text in grouped_entries:
-        best_match = None
-        best_score = 0.0
-        best_prompt = None
-        for script_text, img_prompt in prompt_dict.items():
-            # Check for exact substring match first
-            if script_text.lower() in text.lower():
-                best_match = script_text
-                best_score = 1.0
-                best_prompt = img_prompt
-                break
-            # Fallback to fuzzy matching
-            score = similarity(script_text, text)
-            if score > best_score and score >= similarity_threshold:
-                best_match = script_text
-                best_score = score
-                best_prompt = img_prompt
+        # First substring hit wins, otherwise the best fuzzy match above threshold
+        best_match, best_prompt = matcher.match(text)
         if best_match:
             duration = end - start
             if duration < default_image_duration:
@@ -207,311 +163,253 @@ def get_trigger_intervals(srt_text: str, timings: str, default_image_duration: f
 
     return sorted(intervals, key=lambda x: x[0])
 
-def download_largest_google_image(prompt, local_path):
-    temp_dir = "./imag_temp"
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-
-    # Initialize Chrome WebDriver with headless options
-    options = Options()
-    options.add_argument("--headless=new")  # Use newer headless mode
-    options.add_argument("--no-sandbox")  # Improve compatibility in some environments
-    options.add_argument("--disable-dev-shm-usage")  # Avoid shared memory issues
-    options.add_argument("--disable-gpu")  # Disable GPU for headless stability
-    options.add_argument("--window-size=1920,1080")  # Set a window size for rendering
-
-    # Initialize ChromeDriver
-    driver = webdriver.Chrome(options=options)
-    try:
-        # Construct and visit Google Images search URL
-        encoded_query = urllib.parse.quote(prompt)
+def download_largest_google_image(prompt, local_path, browsers=None):
+    """browsers: BrowserPool to load the search page with, the shared Chrome pool by default."""
+    browsers = browsers or get_pool()
+
+    # Construct and visit Google Images search URL on a warm pooled browser
+    encoded_query = urllib.parse.quote(prompt)
+    with browsers.lease() as driver:
         driver.get(f"https://www.google.com/search?tbm=isch&q={encoded_query}")
 
         # Scroll to load more images
         time.sleep(0.5)
+        page_source = driver.page_source
 
-        # Parse page source
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        
-        # Collect image URLs
-        images = soup.find_all("img")
-        img_urls = []
-        for img in images:
-            img_url = img.get("src") or img.get("data-src")
-            if img_url and img_url.startswith("http"):
-                img_urls.append(img_url)
-            if len(img_urls) >= 25:
-                break
-
-        if not img_urls:
-            raise RuntimeError(f"No valid images found for prompt: {prompt}")
-
-        # Download images and find the largest
-        largest_size = 0
-        largest_path = None
-        largest_ext = "jpg"
-        extension_map = {
-            "image/jpeg": "jpg",
-            "image/png": "png",
-            "image/gif": "gif"
-        }
-
-        for i, img_url in enumerate(img_urls):
-            try:
-                response = requests.get(img_url, stream=True, timeout=10)
-                if response.status_code == 200:
-                    content_type = response.headers.get("content-type", "").lower()
-                    if "image" in content_type:
-                        file_extension = extension_map.get(content_type, "jpg")
-                        file_path = os.path.join(temp_dir, f"image_{i}.{file_extension}")
-                        with open(file_path, "wb") as f:
-                            for chunk in response.iter_content(1024):
-                                f.write(chunk)
-                        file_size = os.path.getsize(file_path)
-                        if file_size > largest_size:
-                            largest_size = file_size
-                            largest_path = file_path
-                            largest_ext = file_extension
-            except Exception:
-                continue
+    # Parse page source
+    soup = BeautifulSoup(page_source, "html.parser")
+    
+    # Collect image URLs
+    images = soup.find_all("img")
+    img_urls = []
+    for img in images:
+        img_url = img.get("src") or img.get("data-src")
+        if img_url and img_url.startswith("http"):
+            img_urls.append(img_url)
+        if len(img_urls) >= 25:
+            break
 
-        if not largest_path:
-            raise RuntimeError(f"No valid images found for prompt: {prompt}")
+    if not img_urls:
+        raise RuntimeError(f"No valid images found for prompt: {prompt}")
 
-        # Save the largest image to the specified local_path
-        final_dir = os.path.dirname(local_path)
-        if final_dir and not os.path.exists(final_dir):
-            os.makedirs(final_dir)
-        
-        with open(largest_path, "rb") as src, open(local_path, "wb") as dst:
-            dst.write(src.read())
+    # Probe every candidate's pixel size from its header, download only the largest
+    saved_path = fetch_largest_image(img_urls, local_path)
+    if not saved_path:
+        raise RuntimeError(f"No valid images found for prompt: {prompt}")
+    return saved_path
 
-        # Clean up temp files
-        for fname in os.listdir(temp_dir):
-            try:
-                os.remove(os.path.join(temp_dir, fname))
-            except Exception:
-                pass
-        os.rmdir(temp_dir)
 
-        return os.path.normpath(local_path)
 
-    finally:
-        driver.quit()
+DIAGRAM_THINK = 4000
+# Diagrams are rasterized at the size they are shown: the top half of the
+# 720x1080 frame (see overlay_cache.fit_overlay)
+DIAGRAM_SIZE = (720, 1080 // 2)
+IO_WORKERS = 8  # concurrent downloads/LLM requests while resolving visuals
 
+def diagram_prompt(details: str) -> str:
+    """The SVG generation prompt for a "diagram" visual."""
+    return f"""
+    Generate a comprehensive SVG diagram of {details}. Respond only with code in an svg code block, do not use comments within your code in order to save space. Include ample padding so that no text overlaps with anything. If the diagram include a graph, include all of the important points. Use the foreignObject tag when creating text boxes so that you can use text wrapping, and to make sure no text overlaps with any object on the screen, and by making sure that the bounds(x,y,y+length,x+width) of the divs inside foreign Objects do not overlaps. In general, try not to make too many text boxes within close proximity of each other.
+    """
 
+def is_svg_response(response: str) -> bool:
+    return "<svg" in response
 
-def image_search_and_cache(prompt_dict: dict, cache_dir: str) -> str:
+ASSET_EXTENSIONS = {"image": ".jpg", "equation": ".png", "diagram": ".png", "text": ".png"}
+
+def asset_path(prompt_dict: dict, cache_dir: str) -> str:
+    """Where the visual for prompt_dict is cached. Raises ValueError for unknown types."""
     # type = "image", search for images on google
     # type = "equation", use a LaTeX renderer to create an image
     # type = "diagram", use a diagram generator to create an image
-    # Common: ensure cache dir exists and compute local_path
+    # type = "text", render the text itself as a card
+    kind = prompt_dict.get("type")
+    if kind not in ASSET_EXTENSIONS:
+        raise ValueError(f"Unknown type: {kind}")
     os.makedirs(cache_dir, exist_ok=True)
-    if prompt_dict.get("type") == "image":
-        prompt = prompt_dict.get("details", "")
-        fname = re.sub(r"[^a-zA-Z0-9_-]", "_", prompt) + ".jpg"
-    elif prompt_dict.get("type") == "equation":
-        equation = prompt_dict.get("details", "")
-        fname = re.sub(r"[^a-zA-Z0-9_-]", "_", equation) + ".png"
-    elif prompt_dict.get("type") == "diagram":
-        diagram_prompt = prompt_dict.get("details", "")
-        fname = re.sub(r"[^a-zA-Z0-9_-]", "_", diagram_prompt) + ".png"
-    elif prompt_dict.get("type") == "text":
-        text_content = prompt_dict.get("details", "")
-        fname = re.sub(r"[^a-zA-Z0-9_-]", "_", text_content[:32]) + ".png"
-    else:
-        raise ValueError(f"Unknown type: {prompt_dict.get('type')}")
-    local_path = os.path.normpath(os.path.join(cache_dir, fname))
+    details = prompt_dict.get("details", "")
+    # Readable prefix plus the store key, so prompts that sanitize alike don't collide
+    stem = re.sub(r"[^a-zA-Z0-9_-]", "_", details[:32] if kind == "text" else details)[:80]
+    fname = f"{stem}_{store_key(kind, details)[:10]}{ASSET_EXTENSIONS[kind]}"
+    return os.path.normpath(os.path.join(cache_dir, fname))
+
+def cached_asset(prompt_dict: dict, local_path: str) -> str:
+    """
+    The visual if this video's cache or the shared asset store already has it
+    (store hits are linked into the cache dir), else None.
+    """
     if os.path.isfile(local_path):
         return local_path
+    stored = get_store().get(prompt_dict.get("type"), prompt_dict.get("details", ""))
+    if stored is None:
+        return None
+    return os.path.normpath(link_or_copy(stored, os.path.splitext(local_path)[0] + os.path.splitext(stored)[1]))
+
+def store_asset(prompt_dict: dict, path: str):
+    """Add a freshly made visual to the shared asset store."""
+    if not path:
+        return
+    try:
+        get_store().put(prompt_dict.get("type"), prompt_dict.get("details", ""), path)
+    except Exception as e:
+        print(f"Failed to add {path} to the asset store: {e}")
+
+def fetch_diagram_svg(prompt_dict: dict, local_path: str) -> str:
+    """Ask the LLM for a diagram and save its SVG next to local_path. Returns the SVG path or None."""
+    print("Generating diagram for prompt:", prompt_dict.get("details", ""))
+    prompt = diagram_prompt(prompt_dict.get("details", ""))
+    response = ai_text(prompt, think=DIAGRAM_THINK, validate=is_svg_response)
+    if not response or "<svg" not in response:
+        print("Failed to generate SVG diagram.")
+        return None
+    # Extract SVG code from code block if present
+    svg_code_match = re.search(r"<svg[\s\S]*?</svg>", response)
+    if svg_code_match:
+        svg_code = svg_code_match.group(0)
+    else:
+        svg_code = response  # fallback, may be just SVG code
 
-    if prompt_dict.get("type") == "text":
-        try:
-            return generate_text_image(prompt_dict.get("details", ""), local_path)
-        except Exception as e:
-            print(f"Failed to render text image: {e}")
-            return None
+    svg_path = os.path.normpath(local_path.replace(".png", ".svg"))
+    with open(svg_path, "w", encoding="utf-8") as f:
+        f.write(svg_code)
+    return svg_path
 
+def image_search_and_cache(prompt_dict: dict, cache_dir: str) -> str:
+    local_path = asset_path(prompt_dict, cache_dir)
+    path = cached_asset(prompt_dict, local_path)
+    if path is None:
+        path = fetch_asset(prompt_dict, local_path)
+        store_asset(prompt_dict, path)
+    return path
+
+def fetch_asset(prompt_dict: dict, local_path: str) -> str:
+    """Download or render one visual to local_path (diagrams end up as .jpg next to it)."""
+    if prompt_dict.get("type") == "text":
+        return text_asset(prompt_dict.get("details", ""), local_path)
     if prompt_dict.get("type") == "image":
         # Use the new download_largest_google_image function instead of GoogleImagesSearch API
-        return download_largest_google_image(prompt, local_path)
-    
-    
-    elif prompt_dict.get("type") == "equation":
-        # Use a LaTeX renderer to create an image 
-        try:
-            print(f"Rendering LaTeX equation to PNG: {prompt_dict.get('details', '')} -> {local_path}")
-            render_latex_to_png(prompt_dict.get('details', ""), output_file=local_path)
-            if not os.path.isfile(local_path):
-                print(f"Equation PNG was not saved at {local_path}")
-                return None
-            return os.path.normpath(local_path)
-        except Exception as e:
-            print(f"Failed to render LaTeX equation: {e}")
-            return None
-    
-    elif prompt_dict.get("type") == "diagram":
-        # Use a diagram generator to create an image (this is a placeholder, implement actual generation)
-        print("Generating diagram for prompt:", prompt_dict.get("details", ""))
-        prompt = f"""
-    Generate a comprehensive SVG diagram of {prompt_dict.get("details","")}. Respond only with code in an svg code block, do not use comments within your code in order to save space. Include ample padding so that no text overlaps with anything. If the diagram include a graph, include all of the important points. Use the foreignObject tag when creating text boxes so that you can use text wrapping, and to make sure no text overlaps with any object on the screen, and by making sure that the bounds(x,y,y+length,x+width) of the divs inside foreign Objects do not overlaps. In general, try not to make too many text boxes within close proximity of each other.
-    """
-        response = ai_text(prompt, think=4000)
-        if not response or "<svg" not in response:
-            print("Failed to generate SVG diagram.")
-            return None
-        # Extract SVG code from code block if present
-        svg_code_match = re.search(r"<svg[\s\S]*?</svg>", response)
-        if svg_code_match:
-            svg_code = svg_code_match.group(0)
-        else:
-            svg_code = response  # fallback, may be just SVG code
-
-        svg_path = os.path.normpath(local_path.replace(".png", ".svg"))
-        with open(svg_path, "w", encoding="utf-8") as f:
-            f.write(svg_code)
-
-        # Convert SVG to JPG using wand
-        try:
-            with open(svg_path, "rb") as svg_file:
-                svg_data = svg_file.read()
-            jpg_path = os.path.normpath(local_path.replace(".png", ".jpg"))
-            with WandImage(blob=svg_data, format="svg") as img:
-                img.format = "jpg"
-                img.background_color = "white"  # set background to white for JPG
-                img.alpha_channel = 'remove'    # remove alpha for JPG
-                img.save(filename=jpg_path)
-                return jpg_path
-        except Exception as e:
-            print(f"Failed to convert SVG to JPG with wand: {e}")
+        return download_largest_google_image(prompt_dict.get("details", ""), local_path)
+    if prompt_dict.get("type") == "equation":
+        return equation_asset(prompt_dict.get("details", ""), local_path)
+    if prompt_dict.get("type") == "diagram":
+        svg_path = fetch_diagram_svg(prompt_dict, local_path)
+        if svg_path is None:
             return None
+        return diagram_jpg(svg_path, local_path)
 
-def superimpose_frame(args):
-    """Superimpose an image onto a frame if within the trigger interval."""
-    i, t, frame_path, trigger_images, W, H, output_dir, frame_count = args
+def diagram_jpg(svg_path: str, local_path: str) -> str:
+    """Rasterize a diagram's SVG next to local_path (as .jpg). None on failure or timeout."""
     try:
-        frame = Image.open(os.path.normpath(frame_path)).convert("RGBA")
+        return get_rasterizer().rasterize(svg_path, diagram_jpg_path(local_path), DIAGRAM_SIZE)
     except Exception as e:
-        print(f"Error opening frame {frame_path}: {e}")
-        return
+        print(f"Failed to convert SVG to JPG with wand: {e}")
+        return None
 
-    for start_ts, end_ts, img_path in trigger_images:
-        if img_path is None:
-            continue  # Skip if image path is None (failed generation)
-        if start_ts <= t <= end_ts:
-            try:
-                top_img = Image.open(os.path.normpath(img_path)).convert("RGBA")
-            except Exception as e:
-                print(f"Error processing image {img_path}: {e}")
-                continue  # Skip this image if it can't be opened
-            try:
-                img_w, img_h = top_img.size
-                max_top_height = H // 2
-                if img_h > max_top_height:
-                    ratio = max_top_height / img_h
-                    new_w = int(img_w * ratio)
-                    new_h = max_top_height
-                    top_img = top_img.resize((new_w, new_h), resample=Image.Resampling.LANCZOS)
-                    img_w, img_h = top_img.size
-                if img_w > W:
-                    ratio = W / img_w
-                    new_h = int(img_h * ratio)
-                    new_w = W
-                    top_img = top_img.resize((new_w, new_h), resample=Image.Resampling.LANCZOS)
-                    img_w, img_h = top_img.size
-                x_top = (W - img_w) // 2
-                y_top = (H // 2 - img_h) // 2
-                frame.paste(top_img, (x_top, y_top), top_img)
-                frame_count[0] += 1
-                break
-            except Exception as e:
-                print(f"Error processing image {img_path}: {e}")
-                continue  # Skip this image if any error occurs
+def diagram_jpg_path(local_path: str) -> str:
+    return os.path.normpath(local_path.replace(".png", ".jpg"))
 
-    output_path = os.path.normpath(os.path.join(output_dir, f"frame_{i:04d}.png"))
-    frame.save(output_path)
+def asset_key(prompt_dict) -> str:
+    """Identical visual prompts share one key, and one fetch/render."""
+    return json.dumps(prompt_dict, sort_keys=True)
 
-def generate_text_image(text_content, local_path, W=720, H=200, PAD=20):
-    """Generate an image of text with autofit, white text, black outline, and drop shadow."""
-    # Try to load DejaVu Sans font
-    font_path = None
-    try:
-        import matplotlib
-        font_path = matplotlib.font_manager.findfont("DejaVu Sans")
-    except Exception:
-        font_path = None
-
-    # Improved word wrapping and autofit font size
-    def wrap_text(text, font, max_width, draw):
-        words = text.split()
-        lines = []
-        line = ''
-        for word in words:
-            test_line = line + (' ' if line else '') + word
-            w = draw.textlength(test_line, font=font)
-            if w > max_width and line:
-                lines.append(line)
-                line = word
+def resolve_assets(prompt_dicts, cache_dir, io_workers=IO_WORKERS, cpu_workers=None):
+    """
+    image_search_and_cache for many visuals at once. Prompts are deduped,
+    downloads and LLM calls go to a thread pool, equation and text rendering
+    to a process pool, and diagrams to the SVG rasterizer once their SVG
+    arrives. A failure (including a visual that came back empty) is recorded
+    and the rest carry on.
+    Returns ({asset_key: path}, [(prompt_dict, error)]).
+    """
+    unique = {}
+    for prompt_dict in prompt_dicts:
+        unique.setdefault(asset_key(prompt_dict), prompt_dict)
+
+    results = {}
+    failures = []
+    local_paths = {}
+    futures = {}  # future -> (key, stage)
+    total = len(unique)
+
+    def report(key, outcome):
+        prompt_dict = unique[key]
+        label = f"{prompt_dict.get('type')}: {str(prompt_dict.get('details', ''))[:60]}" if isinstance(prompt_dict, dict) else str(prompt_dict)[:60]
+        print(f"[{len(results) + len(failures)}/{total}] {label} -> {outcome}")
+
+    # One warm browser per I/O worker, so image searches never queue for a session
+    get_pool().resize(io_workers)
+    io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=io_workers)
+    # spawn (what Windows does anyway): started from make_visuals.py, workers
+    # only import renderers.py
+    cpu_pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=process_workers(cpu_workers or default_workers()), mp_context=multiprocessing.get_context("spawn"),
+    )
+    # SVGs each get their own killable process, with a timeout
+    rasterizer = SvgRasterizer(workers=cpu_workers)
+    with io_pool, cpu_pool, rasterizer:
+        for key, prompt_dict in unique.items():
+            try:
+                local_path = asset_path(prompt_dict, cache_dir)
+                cached = cached_asset(prompt_dict, local_path)
+            except Exception as e:
+                failures.append((prompt_dict, e))
+                report(key, f"failed: {e}")
+                continue
+            if cached:
+                results[key] = cached
+                report(key, cached)
+                continue
+            local_paths[key] = local_path
+            details = prompt_dict.get("details", "")
+            kind = prompt_dict.get("type")
+            if kind == "image":
+                future, stage = io_pool.submit(download_largest_google_image, details, local_path), "done"
+            elif kind == "equation":
+                future, stage = cpu_pool.submit(equation_asset, details, local_path), "done"
+            elif kind == "text":
+                future, stage = cpu_pool.submit(text_asset, details, local_path), "done"
             else:
-                line = test_line
-        if line:
-            lines.append(line)
-        return lines
-
-    max_font_size = 100
-    min_font_size = 20
-    best_font_size = min_font_size
-    for font_size in range(max_font_size, min_font_size-1, -2):
-        try:
-            font = ImageFont.truetype(font_path or "DejaVuSans.ttf", font_size)
-        except Exception:
-            font = ImageFont.load_default()
-        img_temp = Image.new('RGBA', (W, H), (0,0,0,0))
-        draw_temp = ImageDraw.Draw(img_temp)
-        lines = wrap_text(text_content, font, W-2*PAD, draw_temp)
-        total_height = sum([draw_temp.textbbox((0,0), line, font=font)[3] - draw_temp.textbbox((0,0), line, font=font)[1] for line in lines]) + (len(lines)-1)*8
-        if total_height <= H - 2*PAD:
-            best_font_size = font_size
-            break
-    try:
-        font = ImageFont.truetype(font_path or "DejaVuSans.ttf", best_font_size)
-    except Exception:
-        font = ImageFont.load_default()
-    img = Image.new('RGBA', (W, H), (0,0,0,0))
-    draw = ImageDraw.Draw(img)
-    lines = wrap_text(text_content, font, W-2*PAD, draw)
-    total_height = sum([draw.textbbox((0,0), line, font=font)[3] - draw.textbbox((0,0), line, font=font)[1] for line in lines]) + (len(lines)-1)*8
-    y = (H - total_height)//2
-    for line in lines:
-        bbox = draw.textbbox((0,0), line, font=font)
-        text_w = bbox[2] - bbox[0]
-        x = (W - text_w)//2
-        # Draw drop shadow
-        shadow_offset = 3
-        draw.text((x+shadow_offset, y+shadow_offset), line, font=font, fill=(0,0,0,180))
-        # Draw black outline
-        for ox in [-2,0,2]:
-            for oy in [-2,0,2]:
-                if ox == 0 and oy == 0:
+                future, stage = io_pool.submit(fetch_diagram_svg, prompt_dict, local_path), "svg"
+            futures[future] = (key, stage)
+
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                key, stage = futures.pop(future)
+                try:
+                    result = future.result()
+                    if result is None:
+                        raise RuntimeError("no visual produced")
+                    if stage == "svg":
+                        # SVG is in, rasterize it
+                        next_future = rasterizer.submit(result, diagram_jpg_path(local_paths[key]), DIAGRAM_SIZE)
+                        futures[next_future] = (key, "done")
+                        pending.add(next_future)
+                        continue
+                    store_asset(unique[key], result)
+                except Exception as e:
+                    failures.append((unique[key], e))
+                    report(key, f"failed: {e}")
                     continue
-                draw.text((x+ox, y+oy), line, font=font, fill='black')
-        # Draw main white text
-        draw.text((x, y), line, font=font, fill='white')
-        y += bbox[3] - bbox[1] + 8
-    img.save(local_path, format='PNG')
-    return os.path.normpath(local_path)
-
-if __name__ == "__main__":
-    """    if len(sys.argv) != 6:
-        print(f"Usage: {sys.argv[0]} <subtitles.srt> <wav_path> <input_frames_dir> <cache_dir> <output_dir>")
-        sys.exit(1)"""
-
-    srt_path = sys.argv[1]
-    wav_path = sys.argv[2]
-    input_frames_dir = sys.argv[3]
-    cache_dir = sys.argv[4]
-    output_dir = sys.argv[5]
-    vid_name = sys.argv[6]
+                results[key] = result
+                report(key, result)
+
+    print(f"Asset store: {get_store().stats()}, SVG rasterizer: {rasterizer.stats()}")
+    browser_stats = get_pool().stats()
+    if browser_stats["leases"]:
+        print(f"Browser sessions: {browser_stats}")
+    if failures:
+        print(f"{len(failures)} of {total} visuals failed:")
+        for prompt_dict, e in failures:
+            print(f"  {prompt_dict}: {e}")
+    return results, failures
+
+VISUALS_ARGS = ("srt_path", "wav_path", "input_frames_dir", "cache_dir", "output_dir", "vid_name")
+
+def make_visuals(srt_path, wav_path, input_frames_dir, cache_dir, output_dir, vid_name):
+    """The whole visuals stage for one video. Returns a report dict."""
+    start = time.perf_counter()
     with open(srt_path, "r", encoding="utf-8") as f:
         srt_text = f.read()
 
@@ -519,7 +417,7 @@ if __name__ == "__main__":
     prompt = create_prompt(script)
     # Retry AI call until valid JSON is returned
     while True:
-        timings = ai_text(prompt,500).replace("`json", '').replace("`", "")
+        timings = ai_text(prompt, 500, validate=is_timings_json).replace("`json", '').replace("`", "")
         try:
             json.loads(timings)
             break
@@ -547,13 +445,12 @@ if __name__ == "__main__":
     percent = (triggered / total_visuals * 100) if total_visuals else 0
     print(f"Found {triggered} out of {total_visuals} trigger intervals ({percent:.1f}%)")
 
+    assets, failures = resolve_assets([prompt for _, _, prompt in trigger_intervals], cache_dir)
     trigger_images = []
     for start, end, prompt in trigger_intervals:
-        try:
-            img_path = image_search_and_cache(prompt, cache_dir)
-            trigger_images.append((start, end, img_path))
-        except Exception as e:
-            print(f"Failed to fetch image for prompt '{prompt}': {e}")
+        key = asset_key(prompt)
+        if key in assets:  # failed visuals are left out, like before
+            trigger_images.append((start, end, assets[key]))
 
     # Generate an initial image with the video name
     initial_image_path = os.path.join(cache_dir, f"{vid_name}_initial.png")
@@ -565,22 +462,51 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Failed to generate initial image for video name: {e}")
 
-    sr, data = wavfile.read(wav_path)
-    duration = len(data) / sr
-    fps = 30
-    W, H = 720, 1080
-    os.makedirs(output_dir, exist_ok=True)
-
-    num_frames = int(duration * fps)
-    frame_times = np.linspace(0, duration, num_frames)
-    frame_count = [0]
-    args_list = [
-        (i, t, os.path.join(input_frames_dir, f"frame_{i:04d}.png"), trigger_images, W, H, output_dir, frame_count)
-        for i, t in enumerate(frame_times)
-        if os.path.exists(os.path.join(input_frames_dir, f"frame_{i:04d}.png"))
-    ]
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        executor.map(superimpose_frame, args_list)
-
-    print(f"Image superimposition complete. Total frames with superimposed images: {frame_count[0]}")
\ No newline at end of file
+    if output_dir.endswith(".json"):
+        # Just the resolved timeline, compositor.py does the frames (and the final encode)
+        save_trigger_images(trigger_images, output_dir)
+        print(f"Trigger timeline saved to {output_dir}")
+    else:
+        frame_count = composite(input_frames_dir, trigger_images, wav_frame_times(wav_path), output=output_dir)
+        print(f"Image superimposition complete. Total frames with superimposed images: {frame_count}")
+    return {"input": srt_path, "output": output_dir, "visuals": len(assets), "failed": len(failures),
+            "seconds": round(time.perf_counter() - start, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve a video's visuals and lay them over its frames or timeline.")
+    parser.add_argument("srt_path", nargs="?", help="Subtitles, e.g. ./output/x/output.srt")
+    parser.add_argument("wav_path", nargs="?")
+    parser.add_argument("input_frames_dir", nargs="?", help="Character frames dir or sprite track")
+    parser.add_argument("cache_dir", nargs="?")
+    parser.add_argument("output_dir", nargs="?", help="Frames dir, or a .json for the trigger timeline")
+    parser.add_argument("vid_name", nargs="?")
+    parser.add_argument("--serve", metavar="SPOOL_DIR",
+                        help="Stay up and run jobs from SPOOL_DIR, so a batch shares one browser pool and its clients")
+    parser.add_argument("--submit", metavar="SPOOL_DIR", help="Hand this video to a --serve process (runs here if none takes it).")
+    args = parser.parse_args()
+
+    if args.serve:
+        def run(job):
+            report = make_visuals(*(job[name] for name in VISUALS_ARGS))
+            print(f"Visuals for {report['input']}: {report['visuals']} resolved, {report['failed']} failed in {report['seconds']}s")
+            return report
+        spool.serve(args.serve, run)
+        return
+    values = [getattr(args, name) for name in VISUALS_ARGS]
+    if None in values:
+        parser.error(f"{', '.join(VISUALS_ARGS)} are required without --serve")
+    if args.submit:
+        # Paths made absolute, the server may run from another directory
+        job = {name: value if name == "vid_name" else os.path.abspath(value) for name, value in zip(VISUALS_ARGS, values)}
+        job["input"] = job["srt_path"]  # what spool.py names the job by
+        report = spool.submit(args.submit, job, server="visuals")
+        if report is not None:
+            print(f"Visuals done by the server in {report['seconds']}s (job latency {report['latency_seconds']}s)")
+            return
+        print("Making the visuals here instead")
+    make_visuals(*values)
+
+if __name__ == "__main__":
+    # Prefer make_visuals.py: process pool workers re-run the main script, and
+    # from there they skip importing this module's API and browser stack
+    main()
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+"""
+  On-disk cache of LLM responses for images.py and generate_script.py.
+  Responses are keyed by a hash of (model, prompt, thinking budget, template
+  version) and kept in one SQLite file, so reruns of the same script's timing
+  prompt or the same diagram prompt don't go back to the API.
+
+  Set AI_CACHE_MODE to pick how it behaves:
+    on      read and write the cache (default)
+    off     always call the API, never touch the cache
+    refresh always call the API, store the new response
+    replay  offline, only recorded responses, a miss raises CacheMiss
+"""
+
+CACHE_PATH = os.environ.get("AI_CACHE_PATH", "./cache/ai_responses.sqlite")
+CACHE_MODE = os.environ.get("AI_CACHE_MODE", "on")
+CACHE_TTL = float(os.environ.get("AI_CACHE_TTL", 30 * 24 * 3600))  # seconds, 0 = forever
+CACHE_MAX_BYTES = int(os.environ.get("AI_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+MODES = ("on", "off", "refresh", "replay")
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+def cache_key(model, prompt, think=None, version=1):
+    raw = json.dumps([model, prompt, think, version], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        out_dir = os.path.dirname(path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        # One connection shared by this process's threads, SQLite's own locking
+        # (plus the busy timeout) covers other processes using the same file
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+            " size INTEGER, created REAL, last_used REAL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        """Recorded response for key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        """Drop expired rows, then least recently used ones until under max_bytes."""
+        if self.ttl:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """The process-wide ResponseCache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+def cached(model, prompt, fetch, think=None, version=1, validate=None, mode=None):
+    """
+    Response for prompt from the cache, or from fetch() on a miss.
+    validate: optional check on a fresh response, only responses that pass
+    are recorded (so a malformed answer is asked for again next time).
+    """
+    mode = mode or CACHE_MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown AI_CACHE_MODE: {mode}")
+    if mode == "off":
+        return fetch()
+
+    key = cache_key(model, prompt, think, version)
+    cache = get_cache()
+    if mode != "refresh":
+        response = cache.get(key)
+        if response is not None:
+            return response
+    if mode == "replay":
+        raise CacheMiss(f"No recorded {model} response for prompt {key[:12]} (AI_CACHE_MODE=replay)")
+
+    response = fetch()
+    if response is not None and (validate is None or validate(response)):
+        cache.put(key, model, response)
+    return response
@@ -0,0 +1,127 @@
+import time
+import random
+import asyncio
+import functools
+import inspect
+import threading
+
+"""
+  Bounded-concurrency LLM client for images.py and generate_script.py.
+  Requests run on one background event loop: a semaphore caps how many are
+  in flight, a token bucket caps how fast new ones start, and failures are
+  retried with jittered exponential backoff up to max_attempts instead of
+  sleeping 5 s and recursing forever.
+
+  The backend is any callable (prompt, **kwargs) -> text, plain or async,
+  so the client can be pointed at a fake local server instead of Gemini.
+"""
+
+MAX_CONCURRENCY = 8
+RATE = 2.0          # requests started per second
+BURST = 8           # requests that may start at once after a quiet period
+MAX_ATTEMPTS = 6
+BASE_DELAY = 1.0    # seconds, doubled every attempt
+MAX_DELAY = 60.0
+
+class LLMError(RuntimeError):
+    """A request still failed after max_attempts."""
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`. Used from one event loop."""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def backoff_delay(attempt, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """Full-jitter delay before retry number `attempt` (1 = first retry)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+class LLMClient:
+    def __init__(self, backend, max_concurrency=MAX_CONCURRENCY, rate=RATE, burst=BURST,
+                 max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rate = rate
+        self._burst = burst
+        self._loop = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        """Start the client's event loop thread on first use."""
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                # Loop-bound primitives are created on the loop that uses them
+                async def make_limits():
+                    return asyncio.Semaphore(self.max_concurrency), TokenBucket(self._rate, self._burst)
+                self._semaphore, self._bucket = asyncio.run_coroutine_threadsafe(make_limits(), loop).result()
+                self._loop = loop
+        return self._loop
+
+    async def _call_backend(self, prompt, kwargs):
+        if inspect.iscoroutinefunction(self.backend):
+            return await self.backend(prompt, **kwargs)
+        # run_in_executor rather than asyncio.to_thread, which needs Python 3.9
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.backend, prompt, **kwargs))
+
+    async def _generate(self, prompt, kwargs):
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            async with self._semaphore:
+                await self._bucket.acquire()
+                try:
+                    return await self._call_backend(prompt, kwargs)
+                except Exception as e:
+                    last_error = e
+                    print(f"Error in LLM request (attempt {attempt}/{self.max_attempts}): {e}")
+            if attempt < self.max_attempts:
+                # Sleep outside the semaphore so a backing-off request doesn't hold a slot
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+        raise LLMError(f"LLM request failed after {self.max_attempts} attempts: {last_error}") from last_error
+
+    def submit(self, prompt, **kwargs):
+        """concurrent.futures.Future for one request, usable from any thread."""
+        return asyncio.run_coroutine_threadsafe(self._generate(prompt, kwargs), self._ensure_loop())
+
+    async def agenerate(self, prompt, **kwargs):
+        """Async entry point, usable from any event loop."""
+        return await asyncio.wrap_future(self.submit(prompt, **kwargs))
+
+    async def agenerate_many(self, prompts, **kwargs):
+        """
+        All prompts at once (bounded by the client's limits), results in order.
+        Failed prompts give their LLMError in place of text.
+        """
+        return await asyncio.gather(*(self.agenerate(p, **kwargs) for p in prompts), return_exceptions=True)
+
+    def generate(self, prompt, **kwargs):
+        """Blocking entry point. Raises LLMError once max_attempts are used up."""
+        return self.submit(prompt, **kwargs).result()
+
+    def generate_many(self, prompts, **kwargs):
+        """Blocking version of agenerate_many. Failed prompts give their LLMError in place of text."""
+        futures = [self.submit(p, **kwargs) for p in prompts]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except LLMError as e:
+                results.append(e)
+        return results
@@ -0,0 +1,14 @@
+"""
+  Command-line entry for images.py, same arguments:
+    python make_visuals.py <subtitles.srt> <wav_path> <input_frames_dir> <cache_dir> <output_dir> <video_name>
+    python make_visuals.py --serve spool/         stay up for a batch, sharing warm browsers between videos
+    python make_visuals.py <same arguments> --submit spool/
+  The renderer and SVG rasterizer workers are spawned processes, which
+  re-run the main script before doing any work. Starting here instead of
+  images.py means they don't import the Gemini, Google and browser
+  libraries they never use.
+"""
+
+if __name__ == "__main__":
+    from images import main
+    main()
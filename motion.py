@@ -0,0 +1,142 @@
+import os
+import json
+import numpy as np
+
+"""
+  Motion track for the bouncing character.
+  Every frame's segment, volume, scale, bounce and position is computed up
+  front with NumPy, so frame workers only index into arrays.
+"""
+
+# Bounce only when the segment volume is above threshold
+BOUNCE_AMPLITUDE = 25
+BOUNCE_FREQ = 5
+BOUNCE_THRESHOLD = 0.1
+
+TRACK_ARRAYS = ("t", "segment", "vol", "scale", "bounce", "x", "y")
+
+def build_motion_track(frame_times, segments, volumes, sprite_size, W, H, scale_base=0.75, scale_coeff=0.25, fps=30):
+    """
+    Map each frame time to its pause segment with searchsorted and compute
+    all per-frame transforms at once.
+    sprite_size is (width, height) of the character after the initial resize.
+    """
+    t = np.asarray(frame_times, dtype=np.float64)
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    if len(volumes) == 0:
+        volumes = np.array([1.0])
+    max_vol = volumes.max() if volumes.max() > 0 else 1.0
+
+    # First segment whose end is >= t, same as walking the list from 0.
+    # Frames past the last segment (or with no segments) use the last volume
+    segment = np.searchsorted(segments[:, 1], t, side="left")
+    vol = volumes[np.minimum(segment, len(volumes) - 1)]
+    norm_vol = vol / max_vol
+
+    bounce = np.where(
+        vol > BOUNCE_THRESHOLD,
+        -np.abs(vol) * BOUNCE_AMPLITUDE * np.abs(np.sin(t * BOUNCE_FREQ)),
+        0.0,
+    )
+    scale = scale_base + scale_coeff * norm_vol
+
+    """
+      The image is 500 pixels tall,
+      The volume rnages usually from 0 to 0.25,
+      and the subtitles are at around y=600,
+      so we need to keep the image under that
+    """
+    img_w, img_h = sprite_size
+    x = np.trunc(W / 2 - (img_w * scale) / 2 + np.sin(t) * 10).astype(np.int64)
+    y = np.trunc(H - (img_h * scale) + bounce + np.cos(t) + 20).astype(np.int64) + 50
+
+    return {
+        "t": t,
+        "segment": segment.astype(np.int64),
+        "vol": vol,
+        "scale": scale,
+        "bounce": bounce,
+        "x": x,
+        "y": y,
+        "fps": fps,
+        "W": W,
+        "H": H,
+        "sprite_size": (int(img_w), int(img_h)),
+    }
+
+def save_motion_track(track, path):
+    """Save a track as .npz (compact) or .json (readable), picked by extension."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    meta = {"fps": track["fps"], "W": track["W"], "H": track["H"], "sprite_size": list(track["sprite_size"])}
+    if path.endswith(".json"):
+        data = dict(meta)
+        for key in TRACK_ARRAYS:
+            data[key] = np.asarray(track[key]).tolist()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    else:
+        np.savez_compressed(path, meta=json.dumps(meta), **{key: track[key] for key in TRACK_ARRAYS})
+
+def load_motion_track(path):
+    """Load a track written by save_motion_track."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        meta = {key: data[key] for key in ("fps", "W", "H", "sprite_size")}
+        arrays = {key: np.asarray(data[key]) for key in TRACK_ARRAYS}
+    else:
+        with np.load(path) as npz:
+            meta = json.loads(str(npz["meta"]))
+            arrays = {key: npz[key] for key in TRACK_ARRAYS}
+    track = dict(arrays)
+    track.update(meta)
+    track["sprite_size"] = tuple(meta["sprite_size"])
+    return track
+
+def frame_state_runs(track, scale_step=1/256, extra=None):
+    """
+    Runs of consecutive frames whose render state is identical: same x, y,
+    same quantized scale (as SpriteCache sees it) and same `extra` per-frame
+    key (e.g. which overlay is shown). Decided from the track alone, before
+    anything is rendered. Returns (run start frame indices, run lengths).
+    """
+    scale = np.asarray(track["scale"])
+    n = len(scale)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    scale_key = np.round(scale / scale_step) if scale_step else scale
+    keys = [np.asarray(track["x"]), np.asarray(track["y"]), scale_key]
+    if extra is not None:
+        keys.append(np.asarray(extra))
+    changed = np.zeros(n - 1, dtype=bool)
+    for key in keys:
+        changed |= key[1:] != key[:-1]
+    starts = np.flatnonzero(np.concatenate(([True], changed)))
+    lengths = np.diff(np.append(starts, n))
+    return starts, lengths
+
+SPRITE_FILE = "sprite.png"
+TRACK_FILE = "motion.npz"
+
+def is_sprite_track(path):
+    """True if path is a directory written by save_sprite_track."""
+    return os.path.isfile(os.path.join(path, SPRITE_FILE)) and os.path.isfile(os.path.join(path, TRACK_FILE))
+
+def save_sprite_track(track, sprite, out_dir):
+    """
+    Sparse alternative to rendering frames: the one character sprite plus the
+    per-frame (x, y, scale) track. A compositor places the sprite at render time.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    sprite.save(os.path.join(out_dir, SPRITE_FILE))
+    save_motion_track(track, os.path.join(out_dir, TRACK_FILE))
+
+def load_sprite_track(path):
+    """Returns (track, sprite) from a directory written by save_sprite_track."""
+    from PIL import Image
+    track = load_motion_track(os.path.join(path, TRACK_FILE))
+    sprite = Image.open(os.path.join(path, SPRITE_FILE)).convert("RGBA")
+    return track, sprite
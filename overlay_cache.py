@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+"""
+  Cache of overlay images already decoded and fitted to the frame, for
+  images.py. A visual stays on screen for ~90 frames, so it is decoded and
+  resized once instead of once per frame.
+"""
+
+def fit_overlay(top_img, W, H):
+    """
+    Shrink an overlay to fit the top half of a W x H frame.
+    Returns (fitted RGBA image, (x, y) paste offset).
+    """
+    img_w, img_h = top_img.size
+    max_top_height = H // 2
+    if img_h > max_top_height:
+        ratio = max_top_height / img_h
+        new_w = int(img_w * ratio)
+        new_h = max_top_height
+        top_img = top_img.resize((new_w, new_h), resample=Image.Resampling.LANCZOS)
+        img_w, img_h = top_img.size
+    if img_w > W:
+        ratio = W / img_w
+        new_h = int(img_h * ratio)
+        new_w = W
+        top_img = top_img.resize((new_w, new_h), resample=Image.Resampling.LANCZOS)
+        img_w, img_h = top_img.size
+    x_top = (W - img_w) // 2
+    y_top = (H // 2 - img_h) // 2
+    return top_img, (x_top, y_top)
+
+class OverlayCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, img_path, W, H, source=None):
+        """
+        Fitted overlay and paste offset for img_path in a W x H frame.
+        source: the already decoded image, if the caller has it.
+        Raises whatever opening or resizing the image raises.
+        """
+        img_path = os.path.normpath(img_path)
+        try:
+            mtime = os.path.getmtime(img_path)
+        except OSError:
+            if source is None:
+                raise
+            mtime = None
+        key = (img_path, mtime, W, H)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Decode and fit outside the lock, a duplicate on a race is harmless
+        top_img = source if source is not None else Image.open(img_path).convert("RGBA")
+        entry = fit_overlay(top_img, W, H)
+        nbytes = entry[0].width * entry[0].height * 4
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = entry
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes and len(self._cache) > 1:
+                    _, (old, _) = self._cache.popitem(last=False)
+                    self._bytes -= old.width * old.height * 4
+            else:
+                entry = self._cache[key]
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache), "bytes": self._bytes}
@@ -0,0 +1,187 @@
+import os
+import sys
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image
+
+"""
+  Pluggable frame-rendering executor for bounce.py and images.py.
+  In "process" mode the big read-only inputs (sprite, overlay images, motion
+  track, timeline) and the frame buffers live in multiprocessing shared
+  memory, so each task only pickles a frame index. In "thread" mode the same
+  code runs on plain Python objects.
+"""
+
+# Per-worker view of the shared inputs, filled in by init_worker
+state = {}
+_attached = []  # keeps SharedMemory handles alive in workers
+
+# ProcessPoolExecutor raises ValueError for more workers than this on Windows
+WINDOWS_MAX_WORKERS = 61
+
+def process_workers(workers):
+    """workers, capped to what ProcessPoolExecutor accepts on this platform."""
+    if sys.platform == "win32":
+        return min(workers, WINDOWS_MAX_WORKERS)
+    return workers
+
+def default_workers():
+    """Number of cores this process may run on (as many as a process pool can have)."""
+    try:
+        workers = len(os.sched_getaffinity(0))
+    except AttributeError:
+        workers = os.cpu_count() or 1
+    return process_workers(workers)
+
+class SharedStore:
+    """
+    Collects the inputs every frame task needs and turns them into a spec
+    that init_worker can rebuild on the other side. Owns (and unlinks) any
+    shared memory it creates.
+    """
+    def __init__(self, use_shm=True):
+        self.use_shm = use_shm
+        self._spec = {}
+        self._blocks = []
+        self._rings = {}
+
+    def _new_block(self, nbytes):
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self._blocks.append(shm)
+        return shm
+
+    def add_value(self, name, value):
+        """Small picklable values (sizes, paths, settings)."""
+        self._spec[name] = ("value", value)
+
+    def add_image(self, name, img):
+        if not self.use_shm:
+            self._spec[name] = ("value", img)
+            return
+        img = img.convert("RGBA")
+        data = img.tobytes()
+        shm = self._new_block(len(data))
+        shm.buf[:len(data)] = data
+        self._spec[name] = ("image", shm.name, img.size)
+
+    def add_images(self, name, images):
+        """A dict of key -> PIL image, e.g. decoded overlays by path."""
+        if not self.use_shm:
+            self._spec[name] = ("value", dict(images))
+            return
+        entries = {}
+        for key, img in images.items():
+            img = img.convert("RGBA")
+            data = img.tobytes()
+            shm = self._new_block(len(data))
+            shm.buf[:len(data)] = data
+            entries[key] = (shm.name, img.size)
+        self._spec[name] = ("images", entries)
+
+    def add_arrays(self, name, arrays):
+        """A dict of key -> NumPy array, e.g. the motion track."""
+        if not self.use_shm:
+            self._spec[name] = ("value", {k: np.asarray(v) for k, v in arrays.items()})
+            return
+        entries = {}
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = self._new_block(arr.nbytes)
+            np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+            entries[key] = (shm.name, arr.shape, arr.dtype.str)
+        self._spec[name] = ("arrays", entries)
+
+    def add_ring(self, name, slots, slot_bytes):
+        """
+        `slots` reusable frame buffers. Frame i uses slot i % slots, which is
+        safe as long as at most `slots` frames are in flight (map_ordered's window).
+        """
+        if self.use_shm:
+            shm = self._new_block(slots * slot_bytes)
+            buf = shm.buf
+            self._spec[name] = ("ring", shm.name, slots, slot_bytes)
+        else:
+            buf = memoryview(bytearray(slots * slot_bytes))
+            self._spec[name] = ("ring_local", buf, slots, slot_bytes)
+        self._rings[name] = (buf, slots, slot_bytes)
+
+    def slot(self, name, i):
+        """Parent-side view of the ring slot used by frame i."""
+        buf, slots, slot_bytes = self._rings[name]
+        off = (i % slots) * slot_bytes
+        return buf[off:off + slot_bytes]
+
+    def spec(self):
+        return dict(self._spec)
+
+    def close(self):
+        self._rings.clear()
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    _attached.append(shm)
+    return shm
+
+def init_worker(spec):
+    """Executor initializer: rebuild the shared inputs into render_pool.state."""
+    for name, entry in spec.items():
+        kind = entry[0]
+        if kind == "value":
+            state[name] = entry[1]
+        elif kind == "image":
+            _, shm_name, size = entry
+            state[name] = Image.frombuffer("RGBA", size, _attach(shm_name).buf, "raw", "RGBA", 0, 1)
+        elif kind == "images":
+            state[name] = {
+                key: Image.frombuffer("RGBA", size, _attach(shm_name).buf, "raw", "RGBA", 0, 1)
+                for key, (shm_name, size) in entry[1].items()
+            }
+        elif kind == "arrays":
+            state[name] = {
+                key: np.ndarray(shape, np.dtype(dtype), buffer=_attach(shm_name).buf)
+                for key, (shm_name, shape, dtype) in entry[1].items()
+            }
+        elif kind == "ring":
+            _, shm_name, slots, slot_bytes = entry
+            state[name] = (_attach(shm_name).buf, slots, slot_bytes)
+        elif kind == "ring_local":
+            _, buf, slots, slot_bytes = entry
+            state[name] = (buf, slots, slot_bytes)
+
+def slot(name, i):
+    """Worker-side view of the ring slot used by frame i."""
+    buf, slots, slot_bytes = state[name]
+    off = (i % slots) * slot_bytes
+    return buf[off:off + slot_bytes]
+
+def make_executor(kind, spec, workers=None):
+    """
+    kind: "process" (shared memory, one worker per core by default) or
+    "thread" (the old ThreadPoolExecutor behaviour).
+    """
+    workers = workers or default_workers()
+    if kind == "process":
+        # spawn, not fork: forked workers would inherit the ffmpeg stdin pipe
+        # and ffmpeg would never see EOF. It is also what Windows uses anyway
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=process_workers(workers), mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker, initargs=(spec,),
+        )
+    if kind == "thread":
+        # Threads share this module, so initialize once here instead of per thread
+        init_worker(spec)
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor: {kind}")
@@ -0,0 +1,274 @@
+import os
+import re
+import hashlib
+import io
+import numpy as np
+from matplotlib import rc
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image, ImageDraw, ImageFont
+from wand.image import Image as WandImage
+
+"""
+  CPU-bound visual renderers for images.py: LaTeX equations, text cards and
+  SVG diagrams. Kept apart from images.py (API clients, browser) so process
+  pool workers only import what rendering needs.
+"""
+
+def shorten_filename(filename):
+    """Shorten a filename using a hash to avoid errors."""
+    max_length = 255  # Typical max filename length for most filesystems
+    if len(filename) > max_length:
+        # Use a hash of the filename to shorten it
+        hash_part = hashlib.md5(filename.encode()).hexdigest()
+        # Keep the extension and shorten the rest
+        name, ext = os.path.splitext(filename)
+        filename = f"{name[:max_length - len(hash_part) - len(ext) - 1]}_{hash_part}{ext}"
+    return filename
+
+def strip_math_delimiters(equation):
+    """Strip leading/trailing $ and $$ from equation string."""
+    eq = equation.strip()
+    eq = re.sub(r'^(\${1,2})', '', eq)
+    eq = re.sub(r'(\${1,2})$', '', eq)
+    return eq
+
+class EquationRenderer:
+    """
+    One figure, axes and text artist reused for every equation, instead of a
+    new pyplot figure per equation. The output matches the old
+    savefig(bbox_inches='tight') PNGs pixel for pixel.
+    """
+    def __init__(self, fontsize=12, dpi=300):
+        # Use matplotlib's built-in mathtext (no external LaTeX required)
+        rc('text', usetex=False)
+        rc('font', family='serif')
+        self.dpi = dpi
+        # A bare Agg canvas, no pyplot figure manager to create or close
+        self.fig = Figure(figsize=(4, 1), dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+        self.ax.axis('off')  # Hide axes
+        self.fig.patch.set_facecolor('white')
+        self.ax.set_facecolor('white')
+        self.text = self.ax.text(0.5, 0.5, "", fontsize=fontsize, ha='center', va='center', zorder=2)
+
+    def render(self, equation):
+        """PNG bytes of one equation."""
+        self.text.set_text(f"${strip_math_delimiters(equation)}$")
+        canvas = self.fig.canvas
+        canvas.draw()
+
+        # savefig's tight crop (content box + 0.1 in padding). When that box
+        # lands on whole pixels inside the canvas, which is every equation that
+        # fits the axes, savefig would draw exactly these pixels again: crop them
+        box = self.fig.get_tightbbox(canvas.get_renderer()).padded(0.1)
+        W, H = canvas.get_width_height()
+        edges = [v * self.dpi for v in (box.x0, box.y0, box.x1, box.y1)]
+        x0, y0, x1, y1 = [round(v) for v in edges]
+        aligned = all(abs(v - round(v)) < 1e-6 for v in edges)
+        if aligned and 0 <= x0 < x1 <= W and 0 <= y0 < y1 <= H:
+            pixels = np.asarray(canvas.buffer_rgba())[H - y1:H - y0, x0:x1]
+            out = io.BytesIO()
+            Image.fromarray(pixels, "RGBA").save(out, format='PNG', dpi=(self.dpi, self.dpi))
+            return out.getvalue()
+
+        # Equations wider/taller than the figure: let savefig grow the canvas
+        out = io.BytesIO()
+        self.fig.savefig(out, format='png', dpi=self.dpi, bbox_inches='tight', transparent=False)
+        return out.getvalue()
+
+_equation_renderers = {}
+
+def get_equation_renderer(fontsize=12, dpi=300):
+    """This process's renderer for a font size and dpi, created on first use."""
+    key = (fontsize, dpi)
+    if key not in _equation_renderers:
+        _equation_renderers[key] = EquationRenderer(fontsize, dpi)
+    return _equation_renderers[key]
+
+def render_equations(equations, fontsize=12, dpi=300):
+    """Batch API: PNG bytes for each equation, in order, all on one reused figure."""
+    renderer = get_equation_renderer(fontsize, dpi)
+    return [renderer.render(equation) for equation in equations]
+
+def render_latex_to_png(equation, output_file="equation.png", fontsize=12, dpi=300):
+    """
+    Render a LaTeX equation to a PNG image.
+    
+    Parameters:
+    - equation (str): LaTeX equation string (e.g., r'\frac{1}{2} + \sqrt{x^2}').
+    - output_file (str): Path to save the PNG file (default: 'equation.png').
+    - fontsize (int): Font size for the equation (default: 12).
+    - dpi (int): Resolution of the output image (default: 300).
+    """
+    # Shorten the output filename if necessary
+    output_file = shorten_filename(output_file)
+
+    # Render first and publish with os.replace, so an equation mathtext can't
+    # parse leaves no empty PNG behind for later runs to mistake for a result
+    png = get_equation_renderer(fontsize, dpi).render(equation)
+    tmp_path = f"{output_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, output_file)
+
+    print(f"Equation rendered and saved as {output_file}")
+
+TEXT_FONT_SIZES = range(100, 20 - 1, -2)  # largest first, the first that fits wins
+LINE_GAP = 8
+OUTLINE_WIDTH = 2
+SHADOW_OFFSET = 3
+
+_font_path = None
+_fonts = {}
+# Scratch surface for measuring text, nothing is drawn on it
+_measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+def text_font_path():
+    """DejaVu Sans from matplotlib's font manager, looked up once."""
+    global _font_path
+    if _font_path is None:
+        try:
+            import matplotlib.font_manager
+            _font_path = matplotlib.font_manager.findfont("DejaVu Sans")
+        except Exception:
+            _font_path = "DejaVuSans.ttf"
+    return _font_path
+
+def get_font(font_path, size):
+    """Cached (font_path, size) -> FreeTypeFont, falling back to PIL's default font."""
+    key = (font_path, size)
+    if key not in _fonts:
+        try:
+            _fonts[key] = ImageFont.truetype(font_path, size)
+        except Exception:
+            _fonts[key] = ImageFont.load_default()
+    return _fonts[key]
+
+def wrap_text(text, font, max_width):
+    """Greedy word wrap to max_width pixels."""
+    words = text.split()
+    lines = []
+    line = ''
+    for word in words:
+        test_line = line + (' ' if line else '') + word
+        w = _measure.textlength(test_line, font=font)
+        if w > max_width and line:
+            lines.append(line)
+            line = word
+        else:
+            line = test_line
+    if line:
+        lines.append(line)
+    return lines
+
+def layout_text(text, font, max_width):
+    """Wrapped lines with their bboxes, and the block's total height."""
+    lines = [(line, _measure.textbbox((0, 0), line, font=font)) for line in wrap_text(text, font, max_width)]
+    total_height = sum(bbox[3] - bbox[1] for _, bbox in lines) + (len(lines) - 1) * LINE_GAP
+    return lines, total_height
+
+def fit_text(text, W, H, PAD, font_path=None):
+    """
+    Binary search over TEXT_FONT_SIZES for the largest size whose wrapped
+    text fits, smallest size if none do. Returns (font, lines, total_height).
+    """
+    font_path = font_path or text_font_path()
+    sizes = list(TEXT_FONT_SIZES)
+    # Invariant: sizes[:lo] don't fit, sizes[hi:] do (or are past the end)
+    lo, hi = 0, len(sizes)
+    layouts = {}
+    while lo < hi:
+        mid = (lo + hi) // 2
+        font = get_font(font_path, sizes[mid])
+        layouts[mid] = layout_text(text, font, W - 2 * PAD)
+        if layouts[mid][1] <= H - 2 * PAD:
+            hi = mid
+        else:
+            lo = mid + 1
+    best = min(lo, len(sizes) - 1)
+    font = get_font(font_path, sizes[best])
+    lines, total_height = layouts[best] if best in layouts else layout_text(text, font, W - 2 * PAD)
+    return font, lines, total_height
+
+def text_card(text_content, W=720, H=200, PAD=20):
+    """Autofit white text with a black outline and drop shadow on a transparent W x H image."""
+    font, lines, total_height = fit_text(text_content, W, H, PAD)
+    img = Image.new('RGBA', (W, H), (0,0,0,0))
+    draw = ImageDraw.Draw(img)
+    y = (H - total_height)//2
+    for line, bbox in lines:
+        text_w = bbox[2] - bbox[0]
+        x = (W - text_w)//2
+        # Draw drop shadow
+        draw.text((x+SHADOW_OFFSET, y+SHADOW_OFFSET), line, font=font, fill=(0,0,0,180))
+        # White text with a stroked black outline, in one pass
+        draw.text((x, y), line, font=font, fill='white', stroke_width=OUTLINE_WIDTH, stroke_fill='black')
+        y += bbox[3] - bbox[1] + LINE_GAP
+    return img
+
+def generate_text_image(text_content, local_path, W=720, H=200, PAD=20):
+    """Generate an image of text with autofit, white text, black outline, and drop shadow."""
+    text_card(text_content, W, H, PAD).save(local_path, format='PNG')
+    return os.path.normpath(local_path)
+
+def generate_text_images(cards, W=720, H=200, PAD=20):
+    """Batch API: cards is a list of (text, local_path). Returns the saved paths, in order."""
+    return [generate_text_image(text_content, local_path, W, H, PAD) for text_content, local_path in cards]
+
+SVG_PROBE_DENSITY = 72  # dpi an SVG is measured at when ImageMagick reports no density
+
+def svg_to_jpg(svg_path, jpg_path, max_size=None):
+    """
+    Rasterize an SVG file to a JPG on a white background using wand.
+    max_size: (w, h) box to fit in. The SVG is rendered at the density that
+    fits it rather than rendered full size and shrunk later.
+    """
+    with open(svg_path, "rb") as svg_file:
+        svg_data = svg_file.read()
+    resolution = None
+    if max_size:
+        with WandImage.ping(blob=svg_data, format="svg") as probe:
+            width, height, density = probe.width, probe.height, probe.resolution[0]
+        if not density:
+            # Default density not reported: measure at a known one rather than guess the delegate's
+            density = SVG_PROBE_DENSITY
+            with WandImage.ping(blob=svg_data, format="svg", resolution=density) as probe:
+                width, height = probe.width, probe.height
+        scale = min(1.0, max_size[0] / width, max_size[1] / height)
+        if scale < 1.0:
+            resolution = density * scale
+    with WandImage(blob=svg_data, format="svg", resolution=resolution) as img:
+        if max_size and (img.width > max_size[0] or img.height > max_size[1]):
+            # Density rounding can overshoot by a pixel or two
+            img.transform(resize=f"{max_size[0]}x{max_size[1]}")
+        img.format = "jpg"
+        img.background_color = "white"  # set background to white for JPG
+        img.alpha_channel = 'remove'    # remove alpha for JPG
+        img.save(filename=jpg_path)
+    return jpg_path
+
+"""
+  Asset steps used by images.image_search_and_cache and its process pool.
+  Each returns the rendered file's path, or None (with a message) on failure.
+"""
+
+def equation_asset(equation, local_path):
+    try:
+        print(f"Rendering LaTeX equation to PNG: {equation} -> {local_path}")
+        render_latex_to_png(equation, output_file=local_path)
+        if not os.path.isfile(local_path):
+            print(f"Equation PNG was not saved at {local_path}")
+            return None
+        return os.path.normpath(local_path)
+    except Exception as e:
+        print(f"Failed to render LaTeX equation: {e}")
+        return None
+
+def text_asset(text_content, local_path):
+    try:
+        return generate_text_image(text_content, local_path)
+    except Exception as e:
+        print(f"Failed to render text image: {e}")
+        return None
@@ -13,6 +13,13 @@ $TotalFiles = $MarkdownFiles.Count
 $ProcessedFiles = 0
 $TotalTime = 0
 
+# Keep one Whisper model loaded for the whole batch, flow.ps1 submits its transcriptions to it
+$env:TRANSCRIBE_SPOOL = Join-Path (Get-Location) "transcribe_spool"
+$Transcriber = Start-Process -FilePath "python" -ArgumentList "transcriber.py --serve `"$env:TRANSCRIBE_SPOOL`"" -NoNewWindow -PassThru
+# Same for the visuals stage, so the warm browser sessions are reused from video to video
+$env:VISUALS_SPOOL = Join-Path (Get-Location) "visuals_spool"
+$Visuals = Start-Process -FilePath "python" -ArgumentList "make_visuals.py --serve `"$env:VISUALS_SPOOL`"" -NoNewWindow -PassThru
+
 # Update to handle two outputs from generate_script.py
 $Random = New-Object System.Random
 foreach ($MarkdownFile in $MarkdownFiles) {
@@ -55,4 +62,9 @@ foreach ($MarkdownFile in $MarkdownFiles) {
     Write-Host "Processed file: $($MarkdownFile.Name)"
     Write-Host "Time taken: $IterationTime seconds"
     Write-Host "ETA for remaining files: $($ETA.ToString())"
-}
\ No newline at end of file
+}
+
+Stop-Process -Id $Transcriber.Id -ErrorAction SilentlyContinue
+Remove-Item Env:TRANSCRIBE_SPOOL
+Stop-Process -Id $Visuals.Id -ErrorAction SilentlyContinue
+Remove-Item Env:VISUALS_SPOOL
@@ -0,0 +1,120 @@
+import os
+import glob
+import json
+import time
+import concurrent.futures
+
+"""
+  Spool directory protocol for the warm --serve processes (transcriber.py,
+  make_visuals.py): a client writes <id>.job (JSON). A server claims it by
+  renaming it to <id>.running, and when done writes <id>.done (the job's
+  report, or {"error": ...}). Renames are atomic, so any number of clients
+  and servers can share one directory.
+  While it works the server touches <id>.running every HEARTBEAT seconds;
+  a client whose job goes HEARTBEAT_TIMEOUT without one takes it back.
+"""
+
+SUBMIT_WAIT = 10  # seconds for a --serve process to claim a --submit job
+HEARTBEAT = 2  # seconds between a --serve process touching the jobs it is running
+HEARTBEAT_TIMEOUT = 30  # a claimed job untouched this long belongs to a dead server
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def serve(spool_dir, run, workers=1, poll=0.2):
+    """
+    Run jobs from spool_dir forever, `workers` at a time. run(job) gets the
+    job's dict and returns its report dict; an exception is reported as
+    {"error": ...}.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    print(f"Waiting for jobs in {spool_dir}")
+
+    def run_job(running_path):
+        job_id = os.path.splitext(running_path)[0]
+        job = {}
+        report = {"error": "job did not run"}
+        try:
+            with open(running_path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+            queued = time.time() - job.get("submitted", time.time())
+            report = run(job)
+            report["queued_seconds"] = round(queued, 2)
+        except Exception as e:
+            print(f"Job {job.get('input', running_path)} failed: {e}")
+            report = {"error": str(e)}
+        finally:
+            # Always answer, even for a malformed job, so no client waits forever
+            write_json_atomic(job_id + ".done", report)
+            try:
+                os.remove(running_path)
+            except OSError:
+                pass  # the client gave up on us and took it back
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}  # Future -> its .running path
+        last_beat = 0.0
+        while True:
+            in_flight = {f: path for f, path in in_flight.items() if not f.done()}
+            if time.time() - last_beat >= HEARTBEAT:
+                last_beat = time.time()
+                for path in in_flight.values():
+                    try:
+                        os.utime(path)
+                    except OSError:
+                        pass
+            for job_path in sorted(glob.glob(os.path.join(spool_dir, "*.job"))):
+                if len(in_flight) >= workers:
+                    break
+                running_path = os.path.splitext(job_path)[0] + ".running"
+                try:
+                    os.rename(job_path, running_path)
+                except OSError:
+                    continue  # another server (or the client) got it first
+                os.utime(running_path)  # the rename keeps the client's mtime
+                in_flight[executor.submit(run_job, running_path)] = running_path
+            time.sleep(poll)
+
+def submit(spool_dir, job, wait=SUBMIT_WAIT, server="--serve"):
+    """
+    Hand a job dict to a --serve process and wait for it. Returns the report,
+    or None if no server claimed the job within `wait` seconds or the server
+    running it stopped sending heartbeats (it is withdrawn either way).
+    Raises RuntimeError if the server failed the job. server names it in messages.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    job_id = os.path.join(spool_dir, f"{os.getpid()}_{time.time_ns()}")
+    write_json_atomic(job_id + ".job", dict(job, submitted=time.time()))
+    start = time.time()
+    while os.path.exists(job_id + ".job"):
+        if time.time() - start > wait:
+            try:
+                os.remove(job_id + ".job")
+                print(f"No {server} server picked up the job in {wait}s")
+                return None
+            except OSError:
+                break  # claimed just now
+        time.sleep(0.1)
+    while not os.path.exists(job_id + ".done"):
+        try:
+            silent = time.time() - os.path.getmtime(job_id + ".running")
+        except OSError:
+            silent = 0  # just finished, .done is about to show up
+        if silent > HEARTBEAT_TIMEOUT:
+            try:
+                os.remove(job_id + ".running")
+                print(f"The {server} server stopped responding for {silent:.0f}s")
+                return None
+            except OSError:
+                pass  # finished just now
+        time.sleep(0.1)
+    with open(job_id + ".done", "r", encoding="utf-8") as f:
+        report = json.load(f)
+    os.remove(job_id + ".done")
+    if "error" in report:
+        raise RuntimeError(f"The {server} server failed {job.get('input', job_id)}: {report['error']}")
+    report["latency_seconds"] = round(time.time() - start, 2)
+    return report
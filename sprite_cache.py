@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+"""
+  Cache of resized copies of one sprite, keyed by quantized scale.
+  bounce.py asks for the character at a new scale every frame, but the scale
+  only moves over a small range, so most frames can reuse an earlier resize.
+"""
+
+class SpriteCache:
+    def __init__(self, img, step=1/256, max_bytes=256 * 1024 * 1024, resample=Image.BICUBIC):
+        """
+        img: the source sprite (already at its base size)
+        step: scale quantization, e.g. 1/256. 0 or None caches exact scales only
+        max_bytes: memory cap for cached RGBA copies, oldest-used evicted first
+        """
+        self.img = img
+        self.step = step
+        self.max_bytes = max_bytes
+        self.resample = resample
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, scale):
+        if self.step:
+            return round(scale / self.step)
+        return scale
+
+    def _key_scale(self, key):
+        return key * self.step if self.step else key
+
+    def get(self, scale):
+        """Return the sprite resized to (quantized) scale. Safe to call from many threads."""
+        key = self._key(scale)
+        with self._lock:
+            resized = self._cache.get(key)
+            if resized is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return resized
+            self.misses += 1
+
+        # Resize outside the lock so other threads aren't blocked on it.
+        # Two threads may race on the same key, both results are identical
+        q = self._key_scale(key)
+        size = (max(int(self.img.width * q), 1), max(int(self.img.height * q), 1))
+        resized = self.img.resize(size, resample=self.resample)
+        nbytes = size[0] * size[1] * len(resized.getbands())
+
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = resized
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes and len(self._cache) > 1:
+                    _, old = self._cache.popitem(last=False)
+                    self._bytes -= old.width * old.height * len(old.getbands())
+                    self.evictions += 1
+            else:
+                resized = self._cache[key]
+        return resized
+
+    def stats(self):
+        """Hit/miss counters, for picking a quantization step."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
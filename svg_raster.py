@@ -0,0 +1,190 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+import multiprocessing
+import concurrent.futures
+from asset_store import get_store, link_or_copy
+from render_pool import default_workers
+
+"""
+  Rasterizing LLM-generated SVG diagrams for images.py.
+  Up to `workers` warm worker processes each rasterize one SVG at a time, so
+  a pathological SVG (huge foreignObject layouts) can be killed at its
+  timeout on its own; only that worker is replaced, the others keep going
+  and nobody pays process startup per diagram. SVGs are rasterized straight at
+  the size the compositor shows them, and results are cached in the asset
+  store by SVG content hash, so a regenerated but identical SVG is free.
+"""
+
+SVG_TIMEOUT = 60  # seconds per diagram
+SVG_RASTER_VERSION = 1
+
+def svg_cache_details(svg_data, max_size):
+    """Asset store details for an SVG rasterized to max_size."""
+    digest = hashlib.sha256(svg_data).hexdigest()
+    size = f"{max_size[0]}x{max_size[1]}" if max_size else "full"
+    return f"{digest} {size} v{SVG_RASTER_VERSION}"
+
+def _raster_job(svg_path, jpg_path, max_size):
+    """Rasterize into a temp file, publish with os.replace."""
+    from renderers import svg_to_jpg
+    tmp_path = f"{jpg_path}.{os.getpid()}.tmp.jpg"
+    svg_to_jpg(svg_path, tmp_path, max_size)
+    os.replace(tmp_path, jpg_path)
+
+def _raster_worker(conn):
+    """Worker process body: run jobs from conn until it sends None, answering each with an error or None."""
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        try:
+            _raster_job(*job)
+            conn.send(None)
+        except Exception as e:
+            conn.send(f"{type(e).__name__}: {e}")
+
+class SvgRasterizer:
+    def __init__(self, workers=None, timeout=SVG_TIMEOUT):
+        self.timeout = timeout
+        self.workers = workers or default_workers()
+        # Each thread babysits one worker process at a time
+        self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()  # warm (process, connection) pairs, started on demand
+        self._started = []
+        self._inflight = {}  # cache details -> Future of the job rendering them
+        self.cache_hits = 0
+        self.rendered = 0
+        self.timed_out = 0
+
+    def _start_worker(self):
+        conn, child_conn = self._context.Pipe()
+        proc = self._context.Process(target=_raster_worker, args=(child_conn,), daemon=True)
+        proc.start()
+        child_conn.close()
+        with self._lock:
+            self._started.append((proc, conn))
+        return proc, conn
+
+    def _take_worker(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            # At most one job per thread, so this never starts more than `workers`
+            return self._start_worker()
+
+    def _kill_worker(self, proc, conn):
+        proc.kill()
+        proc.join()
+        conn.close()
+        with self._lock:
+            self._started.remove((proc, conn))
+
+    def _run(self, svg_path, jpg_path, max_size, details):
+        proc, conn = self._take_worker()
+        start = time.monotonic()
+        try:
+            conn.send((svg_path, jpg_path, max_size))
+            finished = conn.poll(self.timeout)
+            error = conn.recv() if finished else None
+        except (EOFError, OSError) as e:
+            self._kill_worker(proc, conn)  # died under the job, start a fresh one next time
+            raise RuntimeError(f"Rasterizing {svg_path} failed: worker exited ({e})")
+        if not finished:
+            self._kill_worker(proc, conn)
+            with self._lock:
+                self.timed_out += 1
+            raise TimeoutError(f"Rasterizing {svg_path} took longer than {self.timeout}s")
+        self._idle.put((proc, conn))
+        if error is not None or not os.path.isfile(jpg_path):
+            raise RuntimeError(f"Rasterizing {svg_path} failed: {error}")
+        with self._lock:
+            self.rendered += 1
+        print(f"Rasterized {svg_path} in {time.monotonic() - start:.1f}s")
+        try:
+            get_store().put("svg", details, jpg_path)
+        except Exception as e:
+            # The JPG is fine, only the next identical SVG misses the cache
+            print(f"Failed to add {jpg_path} to the asset store: {e}")
+        return os.path.normpath(jpg_path)
+
+    def submit(self, svg_path, jpg_path, max_size=None):
+        """
+        Future for the JPG of svg_path at jpg_path, at most max_size (w, h).
+        Raises (from the future) TimeoutError or RuntimeError on failure.
+        """
+        with open(svg_path, "rb") as f:
+            details = svg_cache_details(f.read(), max_size)
+        stored = get_store().get("svg", details)
+        if stored is not None:
+            with self._lock:
+                self.cache_hits += 1
+            future = concurrent.futures.Future()
+            future.set_result(os.path.normpath(link_or_copy(stored, jpg_path)))
+            return future
+
+        with self._lock:
+            running = self._inflight.get(details)
+            if running is None:
+                future = self._threads.submit(self._run, svg_path, jpg_path, max_size, details)
+                self._inflight[details] = future
+                future.add_done_callback(lambda _: self._forget(details))
+                return future
+            self.cache_hits += 1
+
+        # The same SVG is already being rasterized, share its result
+        future = concurrent.futures.Future()
+        def copy_result(done):
+            try:
+                future.set_result(os.path.normpath(link_or_copy(done.result(), jpg_path)))
+            except Exception as e:
+                future.set_exception(e)
+        running.add_done_callback(copy_result)
+        return future
+
+    def _forget(self, details):
+        with self._lock:
+            self._inflight.pop(details, None)
+
+    def rasterize(self, svg_path, jpg_path, max_size=None):
+        return self.submit(svg_path, jpg_path, max_size).result()
+
+    def stats(self):
+        with self._lock:
+            return {"cache_hits": self.cache_hits, "rendered": self.rendered, "timed_out": self.timed_out}
+
+    def close(self):
+        self._threads.shutdown(wait=True)
+        for proc, conn in self._started:
+            if proc.is_alive():
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+            proc.join(5)
+            if proc.is_alive():
+                proc.kill()
+            conn.close()
+        self._started = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+_rasterizer = None
+_rasterizer_lock = threading.Lock()
+
+def get_rasterizer():
+    """The process-wide SvgRasterizer, started on first use."""
+    global _rasterizer
+    with _rasterizer_lock:
+        if _rasterizer is None:
+            _rasterizer = SvgRasterizer()
+        return _rasterizer
@@ -0,0 +1,50 @@
+"""
+  audio.py's streamed spectral gate against noisereduce, which it replaced:
+  nr.reduce_noise(stationary=True, prop_decrease=0.75) per channel over the
+  whole file, as audio.py used to call it. The effect board is left out.
+    python -m pytest test_audio.py
+"""
+
+import numpy as np
+import pytest
+from pedalboard.io import AudioFile
+import audio
+
+nr = pytest.importorskip("noisereduce")
+
+SR = 24000
+TOLERANCE = 1e-3  # max abs difference in samples, full scale is 1
+
+class PassThroughBoard:
+    def reset(self):
+        pass
+
+    def __call__(self, samples, samplerate, reset=False):
+        return samples
+
+def noisy_speech(channels, frames, seed=0):
+    """Gated tones in white noise, a different tone and noise per channel."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames) / SR
+    gate = np.sin(2 * np.pi * 0.5 * t) > 0
+    return np.stack([0.3 * np.sin(2 * np.pi * (200 + 50 * c) * t) * gate + (0.01 + 0.01 * c) * rng.standard_normal(frames)
+                     for c in range(channels)]).astype(np.float32)
+
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("frames", [audio.BLOCK_SIZE // 3, audio.BLOCK_SIZE * 2 + 12345])
+def test_matches_noisereduce(tmp_path, monkeypatch, channels, frames):
+    monkeypatch.setattr(audio, "get_board", PassThroughBoard)
+    in_path, out_path = str(tmp_path / "in.wav"), str(tmp_path / "out.wav")
+    with AudioFile(in_path, "w", SR, channels) as f:
+        f.write(noisy_speech(channels, frames))
+    audio.clean_audio(in_path, out_path)
+
+    with AudioFile(in_path) as f:
+        samples = f.read(f.frames)
+    with AudioFile(out_path) as f:
+        cleaned = f.read(f.frames)
+    expected = np.stack([nr.reduce_noise(y=channel, sr=SR, stationary=True, prop_decrease=audio.PROP_DECREASE)
+                         for channel in samples])
+    expected = np.clip(expected, -1.0, 1.0).astype(np.float32)
+    assert cleaned.shape == expected.shape
+    assert np.max(np.abs(cleaned - expected)) < TOLERANCE
@@ -0,0 +1,18 @@
+"""
+  image_fetch.rank_candidates order: largest probed image first, then the
+  candidates whose probe failed or found no size, in search order.
+    python -m pytest test_image_fetch.py
+"""
+
+import image_fetch
+
+def test_failed_probes_go_last_not_away(monkeypatch):
+    sizes = {"small": (10, 10), "big": (300, 200), "flaky": TimeoutError("read timed out"),
+             "html": None, "mid": (100, 100), "reset": ConnectionResetError()}
+    def probe(url, session=None):
+        if isinstance(sizes[url], Exception):
+            raise sizes[url]
+        return sizes[url]
+    monkeypatch.setattr(image_fetch, "probe_image_size", probe)
+    ranked = image_fetch.rank_candidates(list(sizes), session=object())
+    assert ranked == ["big", "mid", "small", "flaky", "html", "reset"]
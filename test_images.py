@@ -0,0 +1,119 @@
+"""
+  images.resolve_assets keeps going when a visual fails: a store or
+  rasterizer error is recorded against that visual and the rest resolve.
+  Downloads, diagrams and the store are stand-ins, nothing leaves the machine.
+    python -m pytest test_images.py
+"""
+
+import os
+import sys
+import types
+import sqlite3
+import concurrent.futures
+import pytest
+
+def _stub_module(name, **attrs):
+    # Only for libraries images.py imports but these tests never call
+    try:
+        __import__(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(sys.modules[parent], child, module)
+
+_stub_module("google")
+_stub_module("google.genai", Client=None)
+_stub_module("google.genai.types")
+_stub_module("google_images_search", GoogleImagesSearch=None)
+_stub_module("bs4", BeautifulSoup=None)
+_stub_module("wand")
+_stub_module("wand.image", Image=None)
+import images
+
+class FlakyStore:
+    """Asset store that is empty, and raises for the details it was told to."""
+    def __init__(self, get_errors=(), put_errors=()):
+        self.get_errors = set(get_errors)
+        self.put_errors = set(put_errors)
+        self.put_calls = []
+
+    def get(self, kind, details):
+        if details in self.get_errors:
+            raise sqlite3.OperationalError("database is locked")
+        return None
+
+    def put(self, kind, details, path):
+        self.put_calls.append(details)
+        if details in self.put_errors:
+            raise OSError(28, "No space left on device")
+
+    def stats(self):
+        return {}
+
+class FakeRasterizer:
+    """SvgRasterizer stand-in: copies the SVG to the JPG path, raises from submit for fail_svgs."""
+    def __init__(self, workers=None, fail_svgs=()):
+        self.fail_svgs = fail_svgs
+
+    def submit(self, svg_path, jpg_path, max_size=None):
+        if os.path.basename(svg_path) in self.fail_svgs:
+            raise FileNotFoundError(f"No such file: {svg_path}")
+        with open(svg_path, "rb") as src, open(jpg_path, "wb") as dst:
+            dst.write(src.read())
+        future = concurrent.futures.Future()
+        future.set_result(jpg_path)
+        return future
+
+    def stats(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+def write_file(path, data=b"x"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return os.path.normpath(path)
+
+@pytest.fixture
+def stand_ins(monkeypatch):
+    def download(details, local_path):
+        return write_file(local_path)
+    def fetch_svg(prompt_dict, local_path):
+        return write_file(local_path.replace(".png", ".svg"), prompt_dict["details"].encode())
+    monkeypatch.setattr(images, "download_largest_google_image", download)
+    monkeypatch.setattr(images, "fetch_diagram_svg", fetch_svg)
+    def use(store, fail_svgs=()):
+        monkeypatch.setattr(images, "get_store", lambda: store)
+        monkeypatch.setattr(images, "SvgRasterizer", lambda workers=None: FakeRasterizer(workers, fail_svgs))
+    return use
+
+def test_store_errors_fail_only_their_visual(tmp_path, stand_ins):
+    store = FlakyStore(get_errors={"locked"}, put_errors={"disk full"})
+    stand_ins(store)
+    prompts = [{"type": "image", "details": details} for details in ("first", "locked", "disk full", "last")]
+    results, failures = images.resolve_assets(prompts, str(tmp_path), io_workers=2, cpu_workers=1)
+
+    assert [(p["details"], type(e)) for p, e in failures] == [("locked", sqlite3.OperationalError)]
+    resolved = {images.asset_key(p) for p in prompts} - {images.asset_key(prompts[1])}
+    assert set(results) == resolved
+    assert all(os.path.isfile(path) for path in results.values())
+    # A failed cache write loses the cache entry, not the visual
+    assert "disk full" in store.put_calls
+
+def test_rasterizer_submit_error_fails_only_its_diagram(tmp_path, stand_ins):
+    prompts = [{"type": "diagram", "details": "evicted"}, {"type": "diagram", "details": "fine"},
+               {"type": "image", "details": "photo"}]
+    evicted_svg = os.path.basename(images.asset_path(prompts[0], str(tmp_path))).replace(".png", ".svg")
+    stand_ins(FlakyStore(), fail_svgs={evicted_svg})
+    results, failures = images.resolve_assets(prompts, str(tmp_path), io_workers=2, cpu_workers=1)
+
+    assert [(p["details"], type(e)) for p, e in failures] == [("evicted", FileNotFoundError)]
+    assert set(results) == {images.asset_key(prompts[1]), images.asset_key(prompts[2])}
+    assert results[images.asset_key(prompts[1])].endswith(".jpg")
@@ -0,0 +1,79 @@
+"""
+  renderers.svg_to_jpg renders SVGs straight at the size that fits max_size.
+  The density it picks is pinned against a stand-in with ImageMagick's
+  sizing (pixels = CSS pixels * density / 96), and checked on a real SVG
+  when Wand and ImageMagick are installed.
+    python -m pytest test_renderers.py
+"""
+
+import sys
+import types
+import pytest
+from PIL import Image
+
+try:
+    import wand.image
+except ImportError:
+    # Only the name renderers.py imports, the tests below bring their own
+    sys.modules["wand"] = types.ModuleType("wand")
+    sys.modules["wand.image"] = types.ModuleType("wand.image")
+    sys.modules["wand.image"].Image = None
+import renderers
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="1440" height="1080"><rect x="10" y="10" width="1420" height="1060" fill="red"/></svg>'
+CSS_DPI = 96
+
+class FakeWandImage:
+    """
+    Sizes SVGs like ImageMagick, at default_density unless given a
+    resolution. Ping reports the default as reported_density, 0 for none.
+    """
+    default_density = CSS_DPI
+    reported_density = CSS_DPI
+
+    def __init__(self, blob=None, format=None, resolution=None):
+        density = resolution or self.default_density
+        self.width = round(1440 * density / CSS_DPI)
+        self.height = round(1080 * density / CSS_DPI)
+        self.resolution = (resolution or self.reported_density,) * 2
+
+    @classmethod
+    def ping(cls, blob=None, format=None, resolution=None):
+        return cls(blob, format, resolution)
+
+    def transform(self, resize):
+        w, h = (int(v) for v in resize.split("x"))
+        scale = min(w / self.width, h / self.height)
+        self.width, self.height = round(self.width * scale), round(self.height * scale)
+
+    def save(self, filename):
+        Image.new("RGB", (self.width, self.height), "white").save(filename, format="JPEG")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+@pytest.fixture
+def svg_path(tmp_path):
+    path = tmp_path / "diagram.svg"
+    path.write_bytes(SVG)
+    return str(path)
+
+# A delegate that doesn't report its default density must not be assumed to use 96
+@pytest.mark.parametrize("default_density, reported_density", [(CSS_DPI, CSS_DPI), (72, 72), (120, 0)])
+@pytest.mark.parametrize("max_size, expected", [((720, 540), (720, 540)), ((720, 1080), (720, 540))])
+def test_density_fits_max_size(svg_path, tmp_path, monkeypatch, default_density, reported_density, max_size, expected):
+    monkeypatch.setattr(FakeWandImage, "default_density", default_density)
+    monkeypatch.setattr(FakeWandImage, "reported_density", reported_density)
+    monkeypatch.setattr(renderers, "WandImage", FakeWandImage)
+    jpg_path = renderers.svg_to_jpg(svg_path, str(tmp_path / "out.jpg"), max_size)
+    assert Image.open(jpg_path).size == expected
+
+@pytest.mark.skipif(not hasattr(renderers.WandImage, "ping"), reason="needs Wand and ImageMagick")
+def test_real_imagemagick_fits_max_size(svg_path, tmp_path):
+    jpg_path = renderers.svg_to_jpg(svg_path, str(tmp_path / "out.jpg"), (720, 540))
+    width, height = Image.open(jpg_path).size
+    # Rendered at the fitting density, not full size and shrunk, so within rounding of the box
+    assert 718 <= width <= 720 and 538 <= height <= 540
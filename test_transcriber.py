@@ -0,0 +1,149 @@
+"""
+  transcriber.py --chunks with a stub model in place of Whisper: the pieces
+  chunk_bounds cuts, how transcribe_chunked moves each piece's words to file
+  time and clamps them into the piece, and that the words come out the same
+  on every run, for any worker count, and as from one pass over the whole file.
+    python -m pytest test_transcriber.py
+"""
+
+import sys
+import time
+import types
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+try:
+    import faster_whisper
+except ImportError:
+    # Only the names transcriber.py imports, the model itself is the stub below
+    faster_whisper = types.ModuleType("faster_whisper")
+    faster_whisper.WhisperModel = None
+    faster_whisper.decode_audio = None
+    sys.modules["faster_whisper"] = faster_whisper
+import transcriber
+
+SR = transcriber.SAMPLE_RATE
+OVERSHOOT = 0.5  # seconds the stub's last word runs past the end of its audio
+
+def make_speech(path, seed=0, seconds=150):
+    """
+    A wav of tone bursts (the words) between silences, some of them long
+    enough to cut at. Returns the wav path and the bursts' (start, end) times.
+    """
+    rng = np.random.default_rng(seed)
+    bursts = []
+    t = 0.5
+    while t < seconds - 2:
+        length = rng.uniform(0.2, 0.6)
+        bursts.append((t, t + length))
+        t += length + (rng.uniform(0.4, 1.2) if rng.random() < 0.15 else rng.uniform(0.03, 0.1))
+    data = np.zeros(int(seconds * SR), dtype=np.float32)
+    for start, end in bursts:
+        first, last = round(start * SR), round(end * SR)
+        data[first:last] = np.where(np.arange(last - first) % 2, 0.5, -0.5)  # a square wave, never near zero
+    wavfile.write(path, SR, data)
+    bursts = [(round(s * SR) / SR, round(e * SR) / SR) for s, e in bursts]
+    return str(path), bursts
+
+class StubModel:
+    """
+    Whisper stand-in for a wav path or samples: one word per tone burst,
+    timed from the samples and named after the burst's length in samples,
+    plus (if overshoot) a last word that runs OVERSHOOT past the audio's end
+    like Whisper's can. Sleeps a little so pieces finish out of order.
+    """
+    def __init__(self, overshoot=True):
+        self.overshoot = overshoot
+
+    def transcribe(self, audio, word_timestamps=True):
+        if isinstance(audio, str):
+            audio = wavfile.read(audio)[1]
+        time.sleep((len(audio) % 7) / 1000)
+        loud = np.abs(audio) > 0.01
+        edges = np.diff(np.concatenate(([0], loud.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        words = [SimpleNamespace(start=s / SR, end=e / SR, word=f" w{e - s}") for s, e in zip(starts, ends)]
+        duration = len(audio) / SR
+        if self.overshoot:
+            words.append(SimpleNamespace(start=duration - 0.1, end=duration + OVERSHOOT, word=" tail"))
+        return [SimpleNamespace(words=words)], SimpleNamespace(duration=duration)
+
+@pytest.fixture
+def speech(tmp_path, monkeypatch):
+    def decode_audio(input_file, sampling_rate=SR):
+        sr, data = wavfile.read(input_file)
+        assert sr == sampling_rate
+        return data.astype(np.float32)
+    monkeypatch.setattr(transcriber, "decode_audio", decode_audio)
+    return make_speech(tmp_path / "speech.wav")
+
+def test_chunk_bounds_cut_in_pauses(speech):
+    wav, bursts = speech
+    bounds = transcriber.chunk_bounds(wav)
+    duration = len(wavfile.read(wav)[1]) / SR
+    assert len(bounds) > 2
+    assert bounds[0][0] == 0.0 and bounds[-1][1] == duration
+    for (_, end), (start, _) in zip(bounds[:-1], bounds[1:]):
+        assert end == start
+    target = transcriber.CHUNK_SECONDS
+    for start, end in bounds[:-1]:
+        assert target / 2 < end - start < target * 1.5
+    # Every cut lands in a silence at least CHUNK_PAUSE long, never in a word
+    for _, cut in bounds[:-1]:
+        before = max(e for s, e in bursts if e <= cut)
+        after = min(s for s, e in bursts if s >= cut)
+        assert after - before >= transcriber.CHUNK_PAUSE
+
+def test_chunk_bounds_short_file(tmp_path):
+    wav, _ = make_speech(tmp_path / "short.wav", seconds=10)
+    assert transcriber.chunk_bounds(wav) == [(0.0, 10.0)]
+
+def test_chunked_words_in_file_time(speech):
+    wav, bursts = speech
+    bounds = transcriber.chunk_bounds(wav)
+    words, duration = transcriber.transcribe_chunked(StubModel(), wav, 2)
+    assert duration == len(wavfile.read(wav)[1]) / SR
+
+    # The stub's burst words, moved by each piece's offset, are the bursts
+    spoken = [(s, e) for s, e, text in words if text != "tail"]
+    assert len(spoken) == len(bursts)
+    np.testing.assert_allclose(spoken, bursts, atol=1.5 / SR)
+
+    # The overshooting last word of each piece is clamped to the piece's end
+    tails = [(s, e) for s, e, text in words if text == "tail"]
+    assert len(tails) == len(bounds)
+    for (start, end), (word_start, word_end) in zip(bounds, tails):
+        assert start <= word_start <= word_end == end
+
+    for start, end, _ in words:
+        assert 0.0 <= start <= end <= duration
+    assert [w[0] for w in words] == sorted(w[0] for w in words)
+
+def test_chunked_deterministic(speech):
+    wav, _ = speech
+    model = StubModel()
+    first, _ = transcriber.transcribe_chunked(model, wav, 1)
+    assert transcriber.transcribe_chunked(model, wav, 1)[0] == first
+    for workers in (2, 3, 8):
+        assert transcriber.transcribe_chunked(model, wav, workers)[0] == first
+
+def test_chunked_matches_single_stream(speech):
+    wav, _ = speech
+    model = StubModel(overshoot=False)
+    whole, whole_duration = transcriber.transcribe_words(model, wav)
+    chunked, chunked_duration = transcriber.transcribe_chunked(model, wav, 4)
+    assert chunked_duration == pytest.approx(whole_duration)
+    assert [text for _, _, text in chunked] == [text for _, _, text in whole]
+    np.testing.assert_allclose([w[:2] for w in chunked], [w[:2] for w in whole], atol=1.5 / SR)
+
+    # Words either side of every cut keep their single-stream times too
+    bounds = transcriber.chunk_bounds(wav)
+    starts = np.array([w[0] for w in whole])
+    for _, cut in bounds[:-1]:
+        after = int(np.searchsorted(starts, cut))
+        for i in (after - 1, after):
+            assert chunked[i][2] == whole[i][2]
+            assert chunked[i][:2] == pytest.approx(whole[i][:2], abs=1.5 / SR)
@@ -0,0 +1,81 @@
+"""
+  PhraseMatcher against the substring-then-SequenceMatcher loop that
+  images.get_trigger_intervals ran before it, on randomized keys and phrases.
+    python -m pytest test_trigger_matcher.py
+"""
+
+import random
+from difflib import SequenceMatcher
+import pytest
+from trigger_matcher import PhraseMatcher
+
+
+def reference_match(prompt_dict, text, similarity_threshold=0.5):
+    """The old per-phrase loop from images.py, verbatim apart from the return."""
+    best_match = None
+    best_score = 0.0
+    best_prompt = None
+    for script_text, img_prompt in prompt_dict.items():
+        # Check for exact substring match first
+        if script_text.lower() in text.lower():
+            best_match = script_text
+            best_score = 1.0
+            best_prompt = img_prompt
+            break
+        # Fallback to fuzzy matching
+        score = SequenceMatcher(None, script_text.lower(), text.lower()).ratio()
+        if score > best_score and score >= similarity_threshold:
+            best_match = script_text
+            best_score = score
+            best_prompt = img_prompt
+    return best_match, best_prompt
+
+# A small alphabet so substrings, near misses and equal ratios are common
+ALPHABET = "abcAB "
+
+def random_text(rng, low, high):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+def random_prompts(rng):
+    prompts = {}
+    for i in range(rng.randint(1, 12)):
+        # Some keys shorter than 3 characters, which have no trigrams
+        key = random_text(rng, 1, 2) if rng.random() < 0.25 else random_text(rng, 3, 14)
+        prompts[key] = f"prompt {i}"
+    return prompts
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_reference_loop(seed):
+    rng = random.Random(seed)
+    prompts = random_prompts(rng)
+    threshold = rng.choice([0.0, 0.3, 0.5, 0.8])
+    matcher = PhraseMatcher(prompts, threshold)
+    keys = list(prompts)
+    for _ in range(30):
+        if rng.random() < 0.3:
+            # Phrases built around a key, in a different case
+            key = rng.choice(keys)
+            text = (random_text(rng, 0, 5) + key + random_text(rng, 0, 5)).swapcase()
+        else:
+            text = random_text(rng, 0, 20)
+        assert matcher.match(text) == reference_match(prompts, text, threshold), text
+
+def test_short_key_substring():
+    prompts = {"long key": "long", "ab": "short"}
+    assert PhraseMatcher(prompts).match("xxABxx") == reference_match(prompts, "xxABxx") == ("ab", "short")
+
+def test_substring_beats_earlier_fuzzy():
+    prompts = {"abcd": "fuzzy", "cab": "substring"}
+    text = "abcab"
+    assert PhraseMatcher(prompts).match(text) == reference_match(prompts, text) == ("cab", "substring")
+
+def test_fuzzy_tie_keeps_first_key():
+    # Both keys score 0.8 against the phrase, the earlier one wins
+    prompts = {"abcdx": "first", "abcdy": "second"}
+    text = "abcdz"
+    assert SequenceMatcher(None, "abcdx", text).ratio() == SequenceMatcher(None, "abcdy", text).ratio()
+    assert PhraseMatcher(prompts).match(text) == reference_match(prompts, text) == ("abcdx", "first")
+
+def test_no_match():
+    prompts = {"abc": "p"}
+    assert PhraseMatcher(prompts).match("zzzzzz") == reference_match(prompts, "zzzzzz") == (None, None)
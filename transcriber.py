@@ -1,10 +1,45 @@
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
 import argparse
+import concurrent.futures
+import functools
+import glob
 import os
+import time
+import numpy as np
+import aligner
+import envelope
+import spool
 os.environ["KMP_DUPLICATE_LIB_OK"]="TRUE"
 
-model = WhisperModel("medium", compute_type="int8")  # or "medium", "large-v2"
+"""
+  Word-per-entry SRT subtitles with Faster Whisper.
+    python transcriber.py in.wav out.srt            one file
+    python transcriber.py --batch a.wav b/*.wav     many files, one model load
+    python transcriber.py --serve spool/            keep the model warm, take jobs from a spool dir
+    python transcriber.py --submit spool/ in.wav out.srt
+                                                    hand a job to a --serve process (falls back
+                                                    to transcribing here if none picks it up)
+    python transcriber.py in.wav out.srt --script scripts/x.txt
+                                                    align the known script instead of decoding,
+                                                    Whisper only redoes what aligner.py is unsure of
+    python transcriber.py in.wav out.srt --chunks 4     cut at pauses, transcribe 4 pieces at a time
+"""
 
+MODEL_SIZE = "medium"  # or "large-v2"
+COMPUTE_TYPE = "int8"
+SAMPLE_RATE = 16000  # what Whisper decodes at
+SPAN_PAD = 0.1  # seconds of silence kept around a re-transcribed span
+FALLBACK_SHARE = 0.5  # transcribe the whole file when more than this much of it is low confidence
+CHUNK_SECONDS = 30  # target length of a --chunks piece
+CHUNK_PAUSE = 0.3  # pieces are only cut inside silences at least this long
+
+@functools.lru_cache(maxsize=None)
+def load_model(model_size=MODEL_SIZE, compute_type=COMPUTE_TYPE, cpu_threads=0, num_workers=1):
+    """The Whisper model, loaded once per process and settings."""
+    start = time.perf_counter()
+    model = WhisperModel(model_size, compute_type=compute_type, cpu_threads=cpu_threads, num_workers=num_workers)
+    print(f"Loaded {model_size} ({compute_type}) in {time.perf_counter() - start:.1f}s")
+    return model
 
 def format_srt_time(seconds):
     hrs = int(seconds // 3600)
@@ -13,24 +48,224 @@ def format_srt_time(seconds):
     millis = int((seconds % 1) * 1000)
     return f"{hrs:02}:{mins:02}:{secs:02},{millis:03}"
 
+def write_word_srt(words, output_file):
+    """One SRT entry per (start, end, text) word."""
+    with open(output_file, "w", encoding="utf-8") as f:
+        counter = 1
+        for start, end, text in words:
+            f.write(f"{counter}\n")
+            f.write(f"{format_srt_time(start)} --> {format_srt_time(end)}\n")
+            f.write(f"{text}\n\n")
+            counter += 1
+
+def transcribe_words(model, input_file):
+    """(start, end, text) of every word, and the audio duration in seconds."""
+    segments, info = model.transcribe(input_file, word_timestamps=True)
+    words = [(word.start, word.end, word.word.strip()) for segment in segments for word in segment.words]
+    return words, info.duration
+
+def transcribe_span(model, audio, start, end):
+    """Words of audio[start:end] (16 kHz samples, times in seconds), with file-relative timestamps."""
+    first = max(int(start * SAMPLE_RATE), 0)
+    segments, _ = model.transcribe(audio[first:int(end * SAMPLE_RATE)], word_timestamps=True)
+    offset = first / SAMPLE_RATE
+    return [(offset + word.start, offset + word.end, word.word.strip()) for segment in segments for word in segment.words]
+
+def chunk_bounds(input_file, target=CHUNK_SECONDS):
+    """(start, end) pieces covering input_file, cut in the middle of its longest pause about every target seconds."""
+    sr, data = envelope.load_mono(input_file)
+    duration = len(data) / sr
+    _, _, gaps = aligner.find_pauses(input_file, min_pause=CHUNK_PAUSE)
+    middles = gaps.mean(axis=1)
+    lengths = gaps[:, 1] - gaps[:, 0]
+    usable = middles < duration - target / 2  # no tiny last piece
+    cuts = [0.0]
+    while True:
+        later = usable & (middles > cuts[-1] + target / 2)
+        if not later.any():
+            break
+        window = later & (middles < cuts[-1] + target * 1.5)
+        if window.any():
+            cuts.append(float(middles[window][np.argmax(lengths[window])]))
+        else:
+            cuts.append(float(middles[later][0]))  # long stretch without pauses, cut at the next one
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+def transcribe_chunked(model, input_file, workers):
+    """
+    transcribe_words on pause-separated pieces, `workers` at a time (the model
+    needs num_workers >= workers to actually run them side by side).
+    """
+    audio = decode_audio(input_file, sampling_rate=SAMPLE_RATE)
+    bounds = chunk_bounds(input_file)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pieces = list(executor.map(lambda b: transcribe_span(model, audio, *b), bounds))
+    words = []
+    for (start, end), piece in zip(bounds, pieces):
+        # Whisper can overshoot the piece a little, keep every word inside its own piece
+        for word_start, word_end, text in piece:
+            word_start = min(max(word_start, start), end)
+            words.append((word_start, min(max(word_end, word_start), end), text))
+    return words, len(audio) / SAMPLE_RATE
+
+def align_words(get_model, input_file, script_text):
+    """
+    (start, end, text) of every script word from aligner.py, with the low
+    confidence stretches re-transcribed by Whisper (all of it if most is).
+    get_model is only called if Whisper is needed. Returns the words, the
+    audio duration and how many seconds of audio went through Whisper.
+    """
+    sr, data = envelope.load_mono(input_file)
+    duration = len(data) / sr
+    words, chunks = aligner.align_script(input_file, script_text)
+    low = [c for c in chunks if c[4] < aligner.MIN_CONFIDENCE]
+    speech = sum(c[3] - c[2] for c in chunks)
+    low_seconds = sum(c[3] - c[2] for c in low)
+    if not words or low_seconds > FALLBACK_SHARE * speech:
+        print(f"Alignment unsure of {low_seconds:.1f}s of {speech:.1f}s, transcribing the whole file")
+        words, duration = transcribe_words(get_model(), input_file)
+        return words, duration, duration
+    if not low:
+        return words, duration, 0.0
+
+    model = get_model()
+    audio = decode_audio(input_file, sampling_rate=SAMPLE_RATE)
+    merged = []
+    for w0, w1, t0, t1, confidence in chunks:
+        if confidence >= aligner.MIN_CONFIDENCE:
+            merged.extend(words[w0:w1])
+        else:
+            merged.extend(transcribe_span(model, audio, t0 - SPAN_PAD, t1 + SPAN_PAD))
+    return merged, duration, low_seconds
+
+def transcribe_file(model, input_file, output_file, script_file=None, chunk_workers=1):
+    """
+    Transcribe one file to a word-per-entry SRT, aligning script_file's text
+    if given, else in pause-separated pieces if chunk_workers > 1. model may
+    also be a zero-argument function returning it, so alignment only loads
+    Whisper when it needs it. Returns a latency report dict.
+    """
+    get_model = model if callable(model) else lambda: model
+    start = time.perf_counter()
+    if script_file:
+        with open(script_file, "r", encoding="utf-8") as f:
+            words, duration, asr_seconds = align_words(get_model, input_file, f.read())
+    elif chunk_workers > 1:
+        words, duration = transcribe_chunked(get_model(), input_file, chunk_workers)
+        asr_seconds = duration
+    else:
+        words, duration = transcribe_words(get_model(), input_file)
+        asr_seconds = duration
+    write_word_srt(words, output_file)
+    elapsed = time.perf_counter() - start
+    return {
+        "input": input_file,
+        "output": output_file,
+        "words": len(words),
+        "audio_seconds": round(duration, 2),
+        "asr_seconds": round(asr_seconds, 2),
+        "seconds": round(elapsed, 2),
+        "realtime_factor": round(elapsed / duration, 3) if duration else None,
+    }
+
+def print_report(report):
+    aligned = f", {report['asr_seconds']}s through Whisper" if report.get("asr_seconds") != report["audio_seconds"] else ""
+    print(f"{report['input']} -> {report['output']}: {report['words']} words, "
+          f"{report['audio_seconds']}s audio in {report['seconds']}s (RTF {report['realtime_factor']}){aligned}")
+
+def run_batch(model, inputs, output_dir=None, workers=1, chunk_workers=1):
+    """Transcribe many files (paths or globs) with one model; each SRT goes next to its input unless output_dir is set."""
+    paths = []
+    for pattern in inputs:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches if matches else [pattern])
+    jobs = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0] + ".srt"
+        jobs.append((path, os.path.join(output_dir or os.path.dirname(path), name)))
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    def one(job):
+        try:
+            return transcribe_file(model, *job, chunk_workers=chunk_workers)
+        except Exception as e:
+            print(f"Failed to transcribe {job[0]}: {e}")
+            return None
+    # num_workers lets the model run this many transcriptions side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        reports = [r for r in executor.map(one, jobs) if r]
+    for report in reports:
+        print_report(report)
+    total = sum(r["seconds"] for r in reports)
+    print(f"Transcribed {len(reports)}/{len(jobs)} files, {total:.1f}s total")
+    return reports
+
+# --serve/--submit jobs (spool.py) are {"input", "output", "script"?} and answer with the latency report
+
+def serve(model, spool_dir, workers=1, poll=0.2, chunk_workers=1):
+    """Transcribe jobs from spool_dir forever, keeping the model loaded."""
+    def run(job):
+        report = transcribe_file(model, job["input"], job["output"], job.get("script"), chunk_workers)
+        print_report(report)
+        return report
+    spool.serve(spool_dir, run, workers, poll)
+
+def submit(spool_dir, input_file, output_file, wait=spool.SUBMIT_WAIT, script_file=None):
+    """
+    Hand a job to a --serve process and wait for it. Returns the report, or
+    None if no server took it (or its server died), see spool.submit.
+    """
+    job = {"input": os.path.abspath(input_file), "output": os.path.abspath(output_file)}
+    if script_file:
+        job["script"] = os.path.abspath(script_file)
+    return spool.submit(spool_dir, job, wait, server="transcription")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Transcribe audio to SRT subtitles.")
-    parser.add_argument("input_file", type=str, help="Path to the input audio file.")
-    parser.add_argument("output_file", type=str, help="Path to the output SRT file.")
+    parser.add_argument("input_file", type=str, nargs="?", help="Path to the input audio file.")
+    parser.add_argument("output_file", type=str, nargs="?", help="Path to the output SRT file.")
+    parser.add_argument("--batch", nargs="+", metavar="WAV", help="Transcribe many files (paths or globs) with one model load.")
+    parser.add_argument("--output_dir", help="Where --batch writes its SRTs (default: next to each input).")
+    parser.add_argument("--serve", metavar="SPOOL_DIR", help="Keep the model loaded and transcribe jobs from SPOOL_DIR.")
+    parser.add_argument("--submit", metavar="SPOOL_DIR", help="Send input_file to a --serve process instead of loading the model here.")
+    parser.add_argument("--script", metavar="TXT", help="Known text of input_file: align it instead of transcribing.")
+    parser.add_argument("--model", default=MODEL_SIZE, help="Whisper model size (default: %(default)s).")
+    parser.add_argument("--compute_type", default=COMPUTE_TYPE)
+    parser.add_argument("--cpu_threads", type=int, default=0, help="Threads per transcription, 0 for the library default.")
+    parser.add_argument("--num_workers", type=int, default=1, help="Transcriptions run side by side (--batch and --serve).")
+    parser.add_argument("--chunks", type=int, default=1, metavar="N", help="Cut each file at pauses and transcribe N pieces at a time.")
     args = parser.parse_args()
+    # Every piece of every file being worked on is its own transcription
+    model_workers = args.num_workers * max(args.chunks, 1)
+    if args.chunks > 1 and not args.cpu_threads:
+        args.cpu_threads = max((os.cpu_count() or 1) // model_workers, 1)  # split the cores between them
 
-    input_file = args.input_file
-    output_file = args.output_file
-    segments, _ = model.transcribe(input_file, word_timestamps=True)
+    if args.submit:
+        if not (args.input_file and args.output_file):
+            parser.error("--submit needs input_file and output_file")
+        report = submit(args.submit, args.input_file, args.output_file, script_file=args.script)
+        if report is not None:
+            print_report(report)
+            print(f"Job latency {report['latency_seconds']}s (queued {report.get('queued_seconds')}s)")
+            raise SystemExit(0)
+        print("Transcribing here instead")
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        counter = 1
-        for segment in segments:
-            for word in segment.words:
-                f.write(f"{counter}\n")
-                start = word.start
-                end = word.end
-                text = word.word.strip()
-                f.write(f"{format_srt_time(start)} --> {format_srt_time(end)}\n")
-                f.write(f"{text}\n\n")
-                counter += 1
\ No newline at end of file
+    if args.script and not args.serve and not args.batch:
+        if not (args.input_file and args.output_file):
+            parser.error("--script needs input_file and output_file")
+        # Whisper only loads if part of the alignment needs re-transcribing
+        get_model = lambda: load_model(args.model, args.compute_type, args.cpu_threads, model_workers)
+        print_report(transcribe_file(get_model, args.input_file, args.output_file, args.script))
+        raise SystemExit(0)
+
+    model = load_model(args.model, args.compute_type, args.cpu_threads, model_workers)
+    if args.serve:
+        serve(model, args.serve, args.num_workers, chunk_workers=args.chunks)
+    elif args.batch:
+        run_batch(model, args.batch, args.output_dir, args.num_workers, args.chunks)
+    else:
+        if not (args.input_file and args.output_file):
+            parser.error("input_file and output_file are required without --batch/--serve")
+        print_report(transcribe_file(model, args.input_file, args.output_file, chunk_workers=args.chunks))
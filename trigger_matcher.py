@@ -0,0 +1,81 @@
+"""
+  Matching subtitle phrases to the script snippets in the timings JSON.
+  Same answers as the substring-then-SequenceMatcher loop images.py used,
+  but the keys are lowercased and indexed once, substring candidates come
+  from a trigram index, and the cheap ratio upper bounds skip most of the
+  full ratio() calls.
+"""
+
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+def _trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+class PhraseMatcher:
+    def __init__(self, prompt_dict, similarity_threshold=0.5):
+        # Keep dict order, ties and substring hits resolve to the earliest key
+        self.keys = list(prompt_dict.keys())
+        self.prompts = list(prompt_dict.values())
+        self.lowered = [key.lower() for key in self.keys]
+        self.similarity_threshold = similarity_threshold
+
+        # trigram -> key indices, plus each key's trigram count. Keys shorter
+        # than 3 characters have no trigrams and are always substring candidates
+        self._index = defaultdict(list)
+        self._trigram_counts = []
+        self._short_keys = []
+        for idx, key in enumerate(self.lowered):
+            grams = _trigrams(key)
+            self._trigram_counts.append(len(grams))
+            if not grams:
+                self._short_keys.append(idx)
+            for gram in grams:
+                self._index[gram].append(idx)
+
+    def _substring_match(self, text):
+        """Index of the first key that is a substring of text, or None."""
+        hits = defaultdict(int)
+        for gram in _trigrams(text):
+            for idx in self._index.get(gram, ()):
+                hits[idx] += 1
+        # A substring's trigrams all occur in text, so only full hits can match
+        candidates = [idx for idx, count in hits.items() if count == self._trigram_counts[idx]]
+        candidates.extend(self._short_keys)
+        for idx in sorted(candidates):
+            if self.lowered[idx] in text:
+                return idx
+        return None
+
+    def _could_win(self, bound, best_score):
+        return bound > best_score and bound >= self.similarity_threshold
+
+    def _fuzzy_match(self, text):
+        """Index of the first key with the best ratio >= threshold, or None."""
+        matcher = SequenceMatcher(None)
+        matcher.set_seq2(text)  # text's index is built once, keys vary
+        best_idx = None
+        best_score = 0.0
+        for idx, key in enumerate(self.lowered):
+            matcher.set_seq1(key)
+            # Upper bounds first: a key that can't strictly beat the current
+            # best or reach the threshold never needs the full ratio
+            if not self._could_win(matcher.real_quick_ratio(), best_score):
+                continue
+            if not self._could_win(matcher.quick_ratio(), best_score):
+                continue
+            score = matcher.ratio()
+            if score > best_score and score >= self.similarity_threshold:
+                best_idx = idx
+                best_score = score
+        return best_idx
+
+    def match(self, text):
+        """(script_text, img_prompt) for a subtitle phrase, or (None, None)."""
+        text = text.lower()
+        idx = self._substring_match(text)
+        if idx is None:
+            idx = self._fuzzy_match(text)
+        if idx is None:
+            return None, None
+        return self.keys[idx], self.prompts[idx]